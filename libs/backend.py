@@ -1,8 +1,13 @@
+import os
 import queue
+import concurrent.futures
 import numpy as np
 import networkx as nx
+from .tracing import traced, stage, count, disable
+from .weighted_paths import bidirectional_dijkstra
 
 ### FUNCTIONALITY 1 ###
+@traced
 def funct_1(G,G_name):
     '''
     input
@@ -43,9 +48,11 @@ def funct_1(G,G_name):
     average_deg = 2*m/n
     
     #Hubs (i.e. nodes whose degree is higher than 95% of degree distro)
-    degrees = dict(G.degree())
-    degree_values = list(degrees.values())
-    percentile_95 = np.percentile(degree_values, 95)
+    with stage('degrees'):
+        degrees = dict(G.degree())
+        degree_values = list(degrees.values())
+        percentile_95 = np.percentile(degree_values, 95)
+        count('nodes_visited', n)
     # If the graph is directed, hubs are stored with paper title and "in" and "out" degrees are included
     if G_name.lower() == 'citation':
         # Find nodes whose degree is above the 95th percentile (named "hubs")
@@ -59,6 +66,7 @@ def funct_1(G,G_name):
     return nodes,edges,density,degrees,average_deg,percentile_95,hubs,is_sparse
 
 ### NODE ID FINDER ###
+@traced
 def id_finder(G,input_str):
     '''
     Finds a node ID given the author's name of the paper's title
@@ -76,9 +84,11 @@ def id_finder(G,input_str):
     else:
         # Stores the ids of authors with a specific name
         ids = [x for x,y in G.nodes(data=True) if y['author_name']==input_str]
+    count('nodes_visited', G.number_of_nodes())
     return ids
 
 ### FUNCTIONALITY 2 ###
+@traced
 def funct_2(G,v,G_name):
     '''
     input
@@ -98,20 +108,24 @@ def funct_2(G,v,G_name):
         
             #Betweenness Centrality
             #we choose k=1000 node samples in order to estimate this centrality
-            betweenness = nx.betweenness_centrality(G, k=1000, normalized=True)[v]
+            with stage('betweenness'):
+                betweenness = nx.betweenness_centrality(G, k=1000, normalized=True)[v]
         
             # PageRank centrality 
-            pr = nx.pagerank(G)[v]
+            with stage('pagerank'):
+                pr = nx.pagerank(G)[v]
             
             #Closeness Centrality 
             #wf_improved = True means we're using the Wasserman and Faust improved formula for
             #                                         graphs with more than one connected component.
-            cc = nx.closeness_centrality(G, v, wf_improved=True)
+            with stage('closeness'):
+                cc = nx.closeness_centrality(G, v, wf_improved=True)
         
             #Degree Centrality
             #in the directed case we return a tuple (indegree centrality, outdegree centrality)
-            in_deg = nx.in_degree_centrality(G)[v]
-            out_deg = nx.out_degree_centrality(G)[v]
+            with stage('degree'):
+                in_deg = nx.in_degree_centrality(G)[v]
+                out_deg = nx.out_degree_centrality(G)[v]
             dc = [in_deg,out_deg]
         
         #Case 2: weighted and undirected graph
@@ -120,16 +134,20 @@ def funct_2(G,v,G_name):
             #Betweenness Centrality
             #we choose k=1000 node samples in order to estimate this centrality
             #in the weighted case, as usual, we give also the weights as input
-            betweenness = nx.betweenness_centrality(G, k=1000, normalized=True, weight = 'weight')[v]
+            with stage('betweenness'):
+                betweenness = nx.betweenness_centrality(G, k=1000, normalized=True, weight = 'weight')[v]
         
             # PageRank centrality 
-            pr = nx.pagerank(G, weight = 'weight')[v]
+            with stage('pagerank'):
+                pr = nx.pagerank(G, weight = 'weight')[v]
 
             #Closeness Centrality has been computed using weighted shortest path
-            cc = nx.closeness_centrality(G, v, distance='weight',wf_improved=True)
+            with stage('closeness'):
+                cc = nx.closeness_centrality(G, v, distance='weight',wf_improved=True)
         
             #Degree Centrality
-            dc = nx.degree_centrality(G)[v]
+            with stage('degree'):
+                dc = nx.degree_centrality(G)[v]
 
         return betweenness,pr,cc,dc
     except:
@@ -137,6 +155,7 @@ def funct_2(G,v,G_name):
         return None
     
 ### BFS ALGRITHM TO FIND THE SHORTEST PATH  - NEEDED FOR FUNCTIONALITY 3###
+@traced
 def shortest_path(G,starting_node,finish_node):
     #First check: if the two nodes are not in the graph, we raise an error
     if starting_node not in G.nodes() or finish_node not in G.nodes():
@@ -146,7 +165,8 @@ def shortest_path(G,starting_node,finish_node):
     #Otherwise we return 1 and print a Error Message
     
     # First of all we find all connected components in the graph
-    connected_components = list(nx.connected_components(G))
+    with stage('components'):
+        connected_components = list(nx.connected_components(G))
     
     # Then we search among all these components
     for component in connected_components:
@@ -173,8 +193,13 @@ def shortest_path(G,starting_node,finish_node):
     
     found_finish_node = False #technical condition
     
+    #Counters for the instrumentation, emitted once after the loop
+    nodes_visited = 1
+    bfs_expansions = 0
+    
     while not Q.empty() and not found_finish_node:
         v = Q.get()
+        bfs_expansions += 1
         
         #Go through the neighbors of v
         for u in list(nx.neighbors(G, v)):
@@ -182,11 +207,15 @@ def shortest_path(G,starting_node,finish_node):
                 previous[u] = v
                 explored[u] = True
                 Q.put(u)
+                nodes_visited += 1
                 #If reached the last node of the path, termine the BFS
                 if u == finish_node:
                     found_finish_node = True
                     break
     
+    count('nodes_visited', nodes_visited)
+    count('bfs_expansions', bfs_expansions)
+    
     #Initialize the shortest path
     path = [finish_node]
     
@@ -209,8 +238,71 @@ def shortest_path(G,starting_node,finish_node):
     #to the last one (finish_node)
     return path[::-1],papers[::-1]
 
+### TOP N SUBGRAPH - NEEDED FOR FUNCTIONALITIES 3, 4 AND 5 ###
+class show_ordered_nodes:
+    '''
+    Node filter of top_n_subgraph, like nx.filters.show_nodes but with the nodes in the order of G:
+    the view iterates over them in O(N) (not over the whole of G) and in a deterministic order
+    '''
+    def __init__(self,G,nodes):
+        selected = set(nodes)
+        self.nodes = dict.fromkeys(node for node in G if node in selected).keys()
+
+    def __call__(self,node):
+        return node in self.nodes
+
+def top_n_subgraph(G,N):
+    '''
+    input
+    G: the graph data
+    N: numerosity of top nodes by degree to consider
+    
+    output
+    G_sub: subgraph of G induced by the top N nodes by degree (a view, not a copy)
+    '''
+    with stage('top_n', N = N):
+        degrees = dict(G.degree())
+        sorted_nodes = [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)]
+        # G.subgraph iterates over the (hash dependent) order of a set of nodes: the filter keeps
+        # the node and adjacency order of G, so the results do not change between runs
+        return nx.subgraph_view(G, filter_node = show_ordered_nodes(G,sorted_nodes[:N]))
+
+### K-HOP NEIGHBOURHOOD - NEEDED FOR THE FOCUSED VISUALIZATIONS ###
+def k_hop_subgraph(G,seeds,k=1,cap=None):
+    '''
+    input
+    G: the graph data
+    seeds: list of nodes (e.g. the nodes of a path or the endpoints of a cut)
+    k: number of hops around the seeds
+    cap: maximum number of nodes added at every hop, the ones with highest degree (None means no cap)
+
+    output
+    G_ego: subgraph of G induced by the seeds and the nodes within k hops of them (a view, not a copy).
+           In a directed graph both the successors and the predecessors are neighbours.
+    '''
+    with stage('k_hop', k = k, cap = cap):
+        region = {node: None for node in seeds if node in G}
+        frontier = list(region)
+        for hop in range(k):
+            #Bounded BFS: only the neighbours of the last hop are expanded
+            candidates = {}
+            for node in frontier:
+                for nbr in (nx.all_neighbors(G,node) if G.is_directed() else G.neighbors(node)):
+                    if nbr not in region:
+                        candidates[nbr] = None
+            #Keep the candidates with highest degree (ties by order of discovery)
+            if cap is not None and len(candidates) > cap:
+                candidates = dict.fromkeys(sorted(candidates, key = G.degree, reverse = True)[:cap])
+            region.update(candidates)
+            frontier = list(candidates)
+            if not frontier:
+                break
+        count('region_nodes', len(region))
+        return G.subgraph(region)
+
 ### FUNCTIONALITY 3 ###
-def funct_3(G,a,a1,an,N):
+@traced
+def funct_3(G,a,a1,an,N,weight=None):
     '''
     input
     G: the graph data
@@ -218,15 +310,15 @@ def funct_3(G,a,a1,an,N):
     a1: starting node
     an: finish node
     N: numerosity of top authors by degree to consider
+    weight: if given (e.g. 'weight'), the edge attribute used as length of the weighted shortest paths;
+            by default the paths are unweighted (BFS)
     
     output
     path: list of authors ids from a1 to an
     papers: list of papers which link the authors [a1,a2,...,an]
     '''
     #Compute the subgraph of G induced by the top N nodes by degree
-    degrees = dict(G.degree())
-    sorted_nodes = [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)]
-    G = G.subgraph(sorted_nodes[:N])
+    G = top_n_subgraph(G,N)
     
     #We add a1 and an in the list to make a complete list of authors
     authors = [a1]
@@ -245,7 +337,10 @@ def funct_3(G,a,a1,an,N):
     
     #Call the previous function for each pair sequence in authors list
     for i in range(len(authors)-1):
-        pair_path,pair_papers = shortest_path(G,authors[i],authors[i+1])
+        if weight is not None:
+            pair_path,pair_papers,_ = bidirectional_dijkstra(G,authors[i],authors[i+1],weight)
+        else:
+            pair_path,pair_papers = shortest_path(G,authors[i],authors[i+1])
 
         #If a pair of authors is not connected
         #End the functionality with error message
@@ -264,6 +359,7 @@ def funct_3(G,a,a1,an,N):
     return path,papers
 
 ### FUNCTIONALITY 4 ###
+@traced
 def funct_4(G,a,b,N):
     '''
     input
@@ -272,9 +368,7 @@ def funct_4(G,a,b,N):
     N: numerosity of top authors by degree to consider
     '''
     #Compute the subgraph of G induced by the top N nodes by degree
-    degrees = dict(G.degree())
-    sorted_nodes = [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)]
-    G = G.subgraph(sorted_nodes[:N])
+    G = top_n_subgraph(G,N)
     
     #Check if the nodes are in the induced subgraph
     if a not in G.nodes() or b not in G.nodes():
@@ -282,18 +376,27 @@ def funct_4(G,a,b,N):
         print(f"node {a} or {b} are not in the induced graph.")
         return 0,[]  #technical output
     else:
+        #The subgraph is a view on G: the capacities are written on a copy of the N nodes subgraph,
+        #so that the input graph is left untouched
+        G = G.copy()
         #Add the capacity label that is the inverse of the weight
         for u, v, d in G.edges(data=True):
         # Inverse of edge weight as capacity (higher weight -> lower capacity)
             G[u][v]['capacity'] = 1 / d['weight']
         
-        k,part = nx.minimum_cut(G,a,b)
+        #The default flow function (preflow-push) does not augment along paths,
+        #so the stage reports the size of the network and of the cut instead
+        with stage('minimum_cut'):
+            k,part = nx.minimum_cut(G,a,b)
+            count('flow_network_edges', G.number_of_edges())
         
-        edge_cut_list = []
-        for p1_node in part[0]:
-            for p2_node in part[1]:
-                if G.has_edge(p1_node,p2_node):
-                    edge_cut_list.append((p1_node,p2_node)) 
+        with stage('cut_edges'):
+            edge_cut_list = []
+            for p1_node in part[0]:
+                for p2_node in part[1]:
+                    if G.has_edge(p1_node,p2_node):
+                        edge_cut_list.append((p1_node,p2_node)) 
+            count('cut_edges', len(edge_cut_list))
         return k,part,edge_cut_list
 
 
@@ -307,7 +410,8 @@ def edge_to_remove(graph):
     edge: edge with highest edge betweenness centrality score overall
     '''
     #the edge_betweenness_centrality works for both cases: directed and undirected graphs
-    G_dict = nx.edge_betweenness_centrality(graph)
+    with stage('edge_betweenness', edges = graph.number_of_edges()):
+        G_dict = nx.edge_betweenness_centrality(graph)
     edge = ()
 
     # extract the edge with highest edge betweenness centrality score
@@ -318,6 +422,7 @@ def edge_to_remove(graph):
     return edge
 
 ### GIRVAN-NEWMAN ALGORITHM - NEEDED FOR FUNCTIONALITY 5 ###
+@traced
 def girvan_newman(graph):
     '''
     input
@@ -338,6 +443,7 @@ def girvan_newman(graph):
         while(sg_count == 1):
             graph.remove_edge(edge_to_remove(graph)[0], edge_to_remove(graph)[1])
             min_num_edges+=1
+            count('girvan_newman_iterations')
             sg = nx.connected_components(graph)
             sg_count = nx.number_connected_components(graph)
     else:
@@ -350,19 +456,126 @@ def girvan_newman(graph):
         while(sg_count == 1):
             graph.remove_edge(edge_to_remove(graph)[0], edge_to_remove(graph)[1])
             min_num_edges+=1
+            count('girvan_newman_iterations')
             #sg = nx.strongly_connected_components(graph)
             #sg_count = nx.number_strongly_connected_components(graph)
             sg = nx.weakly_connected_components(graph)
             sg_count = nx.number_weakly_connected_components(graph)
     return sg,min_num_edges
 
+### PARALLEL GIRVAN-NEWMAN SCHEDULER - NEEDED FOR FUNCTIONALITY 5 ###
+# By default the process pool is used only when the components have more edges than this in total:
+# below it, starting the pool costs more than the components take to solve
+POOL_MIN_EDGES = 2000
+
+def component_payload(G,component,order=None):
+    '''
+    input
+    G: the graph data
+    component: set of nodes of a connected component of G
+    order: dictionary from the nodes of G to their position in G (computed if None)
+    
+    output
+    nodes: list of the nodes of the component, in the order of G
+    payload: (is_directed, number of nodes, int32 array of edges as pairs of positions in nodes)
+             Node ids and attributes stay in the main process, only this compact payload is sent to the workers.
+             The edges are listed as G.subgraph(nodes).edges() would, following the adjacency order of G,
+             so the removals do not depend on the order of the component set.
+    '''
+    if order is None:
+        order = {node: i for i, node in enumerate(G)}
+    nodes = sorted(component, key = order.__getitem__)
+    index = {node: i for i, node in enumerate(nodes)}
+    directed = G.is_directed()
+    edges = np.array([(index[u], index[v]) for u in nodes for v in G.adj[u]
+                      if v in index and (directed or index[v] >= index[u])], dtype = np.int32).reshape(-1, 2)
+    return nodes,(directed,len(nodes),edges)
+
+def girvan_newman_payload(payload):
+    '''
+    Runs the Girvan-Newman algorithm on a component payload, in a worker process
+    
+    output
+    communities: list of lists of node positions
+    min_num_edges: integer that is the number of edges we removed
+    '''
+    directed,n,edges = payload
+    graph = nx.DiGraph() if directed else nx.Graph()
+    graph.add_nodes_from(range(n))
+    graph.add_edges_from(edges.tolist())
+    sg,min_num_edges = girvan_newman(graph)
+    return [list(c) for c in sg],min_num_edges
+
+def communities_by_component(G,connected_components,workers=None):
+    '''
+    Applies the Girvan-Newman algorithm to every connected component of G.
+    Components are independent, so the non-trivial ones are sent to a process pool, largest first.
+    Singletons are skipped (as before) and pairs are solved directly: every edge between the two
+    nodes (not the self-loops) must be removed and each node is a community.
+    
+    input
+    G: the graph data
+    connected_components: list of the connected components of G
+    workers: number of worker processes (None means os.cpu_count() above POOL_MIN_EDGES edges and
+             no pool below, 1 means no pool)
+    
+    output
+    communities: list of communities (lists of nodes), in the order of the components
+    num_links: integer that is the total number of edges we removed
+    '''
+    results = [None]*len(connected_components)
+    jobs = []
+    order = {node: i for i, node in enumerate(G)}
+    for position, component in enumerate(connected_components):
+        if len(component) == 1:
+            continue
+        nodes,payload = component_payload(G,component,order)
+        if len(nodes) == 2:
+            # self-loops have no betweenness and are never removed
+            edges = payload[2]
+            results[position] = ([[node] for node in nodes],int(np.count_nonzero(edges[:,0] != edges[:,1])))
+        else:
+            jobs.append((position,nodes,payload))
+    
+    # largest components first, so that the longest jobs start immediately
+    jobs.sort(key = lambda job: len(job[2][2]), reverse = True)
+    if workers is None:
+        edges = sum(len(payload[2]) for _,_,payload in jobs)
+        workers = (os.cpu_count() or 1) if edges > POOL_MIN_EDGES else 1
+    workers = min(workers, len(jobs))
+    with stage('girvan_newman_components', components = len(jobs), workers = workers):
+        if workers > 1:
+            # forked workers inherit the sink: it is turned off there, so that their stages are not reported
+            with concurrent.futures.ProcessPoolExecutor(max_workers = workers, initializer = disable) as pool:
+                futures = [(position,nodes,pool.submit(girvan_newman_payload,payload)) for position,nodes,payload in jobs]
+                outputs = [(position,nodes,future.result()) for position,nodes,future in futures]
+            # the iterations are counted once, here
+            count('girvan_newman_iterations', sum(k for _,_,(_,k) in outputs))
+        else:
+            # girvan_newman counts its iterations itself
+            outputs = [(position,nodes,girvan_newman_payload(payload)) for position,nodes,payload in jobs]
+        for position,nodes,(c,k) in outputs:
+            results[position] = ([[nodes[i] for i in community] for community in c],k)
+    
+    # merge in the order of the components, independently of the completion order
+    communities = []
+    num_links = 0
+    for result in results:
+        if result is not None:
+            communities.extend(result[0])
+            num_links += result[1]
+    return communities,num_links
+
 ### FUNCTIONALITY 5 ###
-def funct_5(G,paper_1,paper_2,N):
+@traced
+def funct_5(G,paper_1,paper_2,N,workers=None):
     '''
     input
     G: the graph data
     paper_1, paper_2:  strings of paper_ids
     N: numerosity of top papers by degree to consider
+    workers: number of processes used for the connected components (None means a pool only for large
+             components, see communities_by_component, 1 means serial)
     
     output
     k: float that is the minimum number of edges that should be removed to form communities
@@ -371,9 +584,7 @@ def funct_5(G,paper_1,paper_2,N):
     '''
     
     #Compute the subgraph of G induced by the top N nodes by degree
-    degrees = dict(G.degree())
-    sorted_nodes = [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)]
-    G = G.subgraph(sorted_nodes[:N])
+    G = top_n_subgraph(G,N)
     
     #Check if the nodes paper_1 and paper_2 are in the subgraph
     if paper_1 not in G.nodes():
@@ -391,13 +602,15 @@ def funct_5(G,paper_1,paper_2,N):
     #If G is undirected we'll use the simple notion of connection
     #Otherwise we'll use the notion of weakly connection
         
-    if not G.is_directed():
-        # Find all connected components in the graph
-        connected_components = list(nx.connected_components(G))
-    else:
-        #Connected components in weak form
-        #connected_components = list(nx.strongly_connected_components(G))
-        connected_components = list(nx.weakly_connected_components(G))
+    with stage('components'):
+        if not G.is_directed():
+            # Find all connected components in the graph
+            connected_components = list(nx.connected_components(G))
+        else:
+            #Connected components in weak form
+            #connected_components = list(nx.strongly_connected_components(G))
+            connected_components = list(nx.weakly_connected_components(G))
+        count('components', len(connected_components))
             
     # Check if paper_1 and paper_2 are in the same connected component
     in_same_component = any(paper_1 in component and paper_2 in component for component in connected_components)
@@ -413,14 +626,8 @@ def funct_5(G,paper_1,paper_2,N):
         #implementation found at https://www.analyticsvidhya.com/blog/2020/04/community-detection-graphs-networks/
          
         # find the nodes forming the communities
-        communities = []
-        num_links = 0
-        for component in connected_components:
-            if len(list(component)) > 1:
-                c,k = girvan_newman(G.subgraph(list(component)).copy())
-                num_links += k
-                for i in c:
-                    communities.append(list(i))
+        # each component is processed independently (in parallel when there are several)
+        communities,num_links = communities_by_component(G,connected_components,workers)
 
         # find wheter paper_1 and paper_2 belong to the same comunity
         are_in_same_com = any(paper_1 in comunity and paper_2 in comunity for comunity in communities)
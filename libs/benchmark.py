@@ -0,0 +1,454 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import numpy as np
+import networkx as nx
+from . import backend, topk
+from .weighted_paths import bidirectional_dijkstra
+from .graphformat import intern_attributes
+
+# Default sizes (number of edges) of the synthetic graphs
+SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+
+# Default path of the real citation graph shipped with the repository
+CITATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'citation_graph.graphml')
+
+### SYNTHETIC CITATION GRAPH ###
+def citation_graph(m, seed=0, out_degree=5, p_uniform=0.2):
+    '''
+    Builds a directed citation graph with a power-law in-degree distribution.
+    Each paper cites out_degree older papers: with probability p_uniform the cited paper
+    is chosen uniformly, otherwise the target of an earlier citation is copied
+    (copying model, which gives a preferential attachment effect).
+
+    input
+    m: approximate number of edges
+    seed: seed of the random generator
+    out_degree: number of citations given by every paper
+    p_uniform: probability of citing a paper chosen uniformly at random
+
+    output
+    G: nx.DiGraph with string node ids and a 'title' attribute on every node
+    '''
+    rng = np.random.default_rng(seed)
+    n = max(m // out_degree, out_degree + 2)
+    sources = np.repeat(np.arange(1, n), out_degree)[:m]
+    targets = np.empty(len(sources), dtype = np.int64)
+
+    # The first block only cites uniformly, then blocks of doubling size
+    # copy targets of the citations created in the previous blocks
+    start = min(len(sources), out_degree*out_degree)
+    targets[:start] = (rng.random(start)*sources[:start]).astype(np.int64)
+    while start < len(sources):
+        stop = min(len(sources), 2*start)
+        src = sources[start:stop]
+        uniform = (rng.random(stop-start)*src).astype(np.int64)
+        copied = targets[rng.integers(0, start, size = stop-start)]
+        targets[start:stop] = np.where(rng.random(stop-start) < p_uniform, uniform, copied)
+        start = stop
+
+    G = nx.DiGraph()
+    G.add_nodes_from((str(i), {'title': f'Paper {i}'}) for i in range(n))
+    G.add_edges_from(zip(sources.astype(str).tolist(), targets.astype(str).tolist()))
+    return G
+
+### SYNTHETIC COLLABORATION GRAPH ###
+def collaboration_graph(m, seed=0, mean_degree=6, p_uniform=0.2):
+    '''
+    Builds an undirected weighted collaboration graph with a power-law degree distribution.
+    Every edge carries a 'weight' in (0,1] and the 'paper' that links the two authors.
+
+    input
+    m: approximate number of edges
+    seed: seed of the random generator
+    mean_degree: average degree of the authors
+    p_uniform: probability of collaborating with an author chosen uniformly at random
+
+    output
+    G: nx.Graph with string node ids and an 'author_name' attribute on every node
+    '''
+    rng = np.random.default_rng(seed)
+    per_node = max(mean_degree // 2, 1)
+    n = max(m // per_node, per_node + 2)
+    sources = np.repeat(np.arange(1, n), per_node)[:m]
+    targets = np.empty(len(sources), dtype = np.int64)
+
+    start = min(len(sources), per_node*per_node)
+    targets[:start] = (rng.random(start)*sources[:start]).astype(np.int64)
+    while start < len(sources):
+        stop = min(len(sources), 2*start)
+        src = sources[start:stop]
+        uniform = (rng.random(stop-start)*src).astype(np.int64)
+        # Copy either endpoint of an earlier edge, so that hubs keep growing
+        earlier = rng.integers(0, start, size = stop-start)
+        copied = np.where(rng.random(stop-start) < 0.5, targets[earlier], sources[earlier])
+        copied = np.where(copied < src, copied, uniform)
+        targets[start:stop] = np.where(rng.random(stop-start) < p_uniform, uniform, copied)
+        start = stop
+
+    weights = np.round(1/rng.integers(1, 6, size = len(sources)), 3)
+    papers = rng.integers(0, max(len(sources)//3, 1), size = len(sources))
+
+    G = nx.Graph()
+    G.add_nodes_from((str(i), {'author_name': f'Author {i}'}) for i in range(n))
+    G.add_edges_from((str(u), str(v), {'weight': w, 'paper': f'Paper {p}'})
+                     for u, v, w, p in zip(sources.tolist(), targets.tolist(), weights.tolist(), papers.tolist()))
+    return G
+
+### BENCHMARK CASES ###
+def top_nodes(G, N):
+    '''
+    input
+    G: the graph data
+    N: number of nodes to return
+
+    output
+    list of the top N nodes by degree, the same ordering used by the backend
+    '''
+    degrees = dict(G.degree())
+    return [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)][:N]
+
+def connected_pair(G, nodes):
+    '''
+    Picks two nodes among the given ones that lie in the same connected component
+    (weakly connected for directed graphs), so that path and cut queries are meaningful.
+    '''
+    H = G.subgraph(nodes)
+    components = nx.weakly_connected_components(H) if H.is_directed() else nx.connected_components(H)
+    component = max(components, key = len)
+    ordered = [x for x in nodes if x in component]
+    return ordered[0], ordered[-1]
+
+# Number of sources sampled by funct_2 for the betweenness, it fails on smaller graphs
+FUNCT_2_SAMPLES = 1000
+
+# The graphml loading cases keep the whole file in memory, they are skipped on larger graphs
+GRAPHML_MAX_EDGES = 10**6
+# Number of random point-to-point queries timed together by dijkstra_query
+QUERIES = 100
+
+class CaseFailed(Exception):
+    pass
+
+def make_cases(N):
+    '''
+    input
+    N: numerosity of top nodes by degree used by funct_3, funct_4 and funct_5
+
+    output
+    cases: dictionary {case name: (graph kinds it applies to, function G -> callable, check)}
+    The function receives the graph and returns a zero-argument callable that runs the case,
+    so that the arguments are prepared outside of the measured region, or None if the case
+    does not apply to the graph. check(result) tells whether the output of the case is valid:
+    the backend reports most errors by printing and returning a placeholder, which would
+    otherwise be timed as a (fast) valid run.
+    '''
+    def case_funct_1(G):
+        G_name = 'citation' if G.is_directed() else 'collaboration'
+        return lambda: backend.funct_1(G, G_name)
+
+    def check_funct_1(result):
+        return isinstance(result, tuple) and len(result) in (8, 10)
+
+    def case_id_finder(G):
+        node = top_nodes(G, 1)[0]
+        label = G.nodes[node]['title' if G.is_directed() else 'author_name']
+        return lambda: backend.id_finder(G, label)
+
+    def check_id_finder(result):
+        return isinstance(result, list) and len(result) > 0
+
+    def case_funct_2(G):
+        if G.number_of_nodes() < FUNCT_2_SAMPLES:
+            return None
+        G_name = 'citation' if G.is_directed() else 'collaboration'
+        node = top_nodes(G, 1)[0]
+        return lambda: backend.funct_2(G, node, G_name)
+
+    def check_funct_2(result):
+        return isinstance(result, tuple) and len(result) == 4 and all(x is not None for x in result)
+
+    def case_shortest_path(G):
+        a, b = connected_pair(G, top_nodes(G, N))
+        return lambda: backend.shortest_path(G, a, b)
+
+    def check_path(result):
+        return isinstance(result, tuple) and len(result) >= 2 and len(result[0]) > 0
+
+    def case_funct_3(G):
+        nodes = top_nodes(G, N)
+        a1, an = connected_pair(G, nodes)
+        return lambda: backend.funct_3(G, [], a1, an, N)
+
+    def case_funct_3_weighted(G):
+        nodes = top_nodes(G, N)
+        a1, an = connected_pair(G, nodes)
+        return lambda: backend.funct_3(G, [], a1, an, N, 'weight')
+
+    def case_funct_4(G):
+        a, b = connected_pair(G, top_nodes(G, N))
+        return lambda: backend.funct_4(G, a, b, N)
+
+    def check_funct_4(result):
+        return isinstance(result, tuple) and len(result) == 3
+
+    def case_funct_5(G):
+        a, b = connected_pair(G, top_nodes(G, N))
+        return lambda: backend.funct_5(G, a, b, N)
+
+    def check_funct_5(result):
+        return isinstance(result, tuple) and len(result) == 3 and len(result[1]) > 0
+
+    def query_pairs(G):
+        rng = np.random.default_rng(0)
+        nodes = list(G)
+        return [(nodes[i], nodes[j]) for i, j in rng.integers(0, len(nodes), size = (QUERIES, 2)).tolist()]
+
+    def case_dijkstra_query(G):
+        pairs = query_pairs(G)
+        return lambda: [bidirectional_dijkstra(G, a, b)[2] for a, b in pairs]
+
+    def check_queries(result):
+        # the synthetic collaboration graphs are connected
+        return len(result) == QUERIES and all(length < float('inf') for length in result)
+
+    def case_load_graphml(intern):
+        # The retained memory of these two cases is the resident size of the loaded graph,
+        # with one string per attribute value or with the equal values shared
+        def case(G):
+            if G.number_of_edges() > GRAPHML_MAX_EDGES:
+                return None
+            text = '\n'.join(nx.generate_graphml(G))
+            def run():
+                H = nx.parse_graphml(text)
+                if intern:
+                    intern_attributes(H)
+                return H
+            return run
+        return case
+
+    def check_load_graphml(result):
+        return result.number_of_nodes() > 0
+
+    def case_top_k(measure):
+        def case(G):
+            G_name = 'citation' if G.is_directed() else 'collaboration'
+            return lambda: topk.top_k_central(G, 10, measure, G_name)
+        return case
+
+    def check_top_k(result):
+        return isinstance(result, tuple) and len(result) == 3 and 0 < len(result[0]) == len(result[1]) == len(result[2])
+
+    return {
+        'funct_1': (('citation', 'collaboration'), case_funct_1, check_funct_1),
+        'id_finder': (('citation', 'collaboration'), case_id_finder, check_id_finder),
+        'funct_2': (('citation', 'collaboration'), case_funct_2, check_funct_2),
+        'shortest_path': (('collaboration',), case_shortest_path, check_path),
+        'funct_3': (('collaboration',), case_funct_3, check_path),
+        'funct_3_weighted': (('collaboration',), case_funct_3_weighted, check_path),
+        'funct_4': (('collaboration',), case_funct_4, check_funct_4),
+        'funct_5': (('citation',), case_funct_5, check_funct_5),
+        'dijkstra_query': (('collaboration',), case_dijkstra_query, check_queries),
+        'load_graphml': (('citation', 'collaboration'), case_load_graphml(False), check_load_graphml),
+        'load_graphml_interned': (('citation', 'collaboration'), case_load_graphml(True), check_load_graphml),
+        'top_k_closeness': (('citation', 'collaboration'), case_top_k('closeness'), check_top_k),
+        'top_k_betweenness': (('citation', 'collaboration'), case_top_k('betweenness'), check_top_k),
+        'top_k_pagerank': (('citation', 'collaboration'), case_top_k('pagerank'), check_top_k),
+    }
+
+### MEASUREMENTS ###
+def measure(run, repeat, check = None):
+    '''
+    input
+    run: zero-argument callable to measure
+    repeat: number of timed runs
+    check: function telling whether the output of run is valid, None to accept any output but None
+
+    output
+    times: list of wall times in seconds, one per run
+    peak: peak memory in bytes allocated by one extra (traced) run
+    retained: memory in bytes still allocated at the end of the traced run, i.e. held by its output
+
+    A run that raises or returns an invalid output raises CaseFailed.
+    '''
+    times = []
+    # The backend prints its error messages: they are kept to explain a failed case
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            try:
+                result = run()
+            except Exception as e:
+                raise CaseFailed(f'{type(e).__name__}: {e}') from e
+            times.append(time.perf_counter() - start)
+            if result is None or (check is not None and not check(result)):
+                printed = output.getvalue().strip()
+                raise CaseFailed('invalid output' + (f' ({printed.splitlines()[-1]})' if printed else ''))
+        # tracemalloc slows the code down, so the peak memory is measured in a separate run
+        tracemalloc.start()
+        try:
+            result = run()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del result
+    return times, peak, retained
+
+def graphs(sizes, seed, citation_path):
+    '''
+    Generator of the graphs to benchmark, yielding (graph label, kind, G).
+    Graphs are built one at a time so that only one of them is resident at any moment.
+    '''
+    if citation_path and os.path.exists(citation_path):
+        yield 'citation_graph.graphml', 'citation', nx.read_graphml(citation_path)
+    for m in sizes:
+        yield f'citation-{m}', 'citation', citation_graph(m, seed = seed)
+        yield f'collaboration-{m}', 'collaboration', collaboration_graph(m, seed = seed)
+
+def run_benchmarks(sizes = SIZES, functions = None, repeat = 3, seed = 0, N = 100, citation_path = CITATION_PATH, log = None):
+    '''
+    input
+    sizes: list of numbers of edges of the synthetic graphs
+    functions: list of case names to run, all of them if None
+    repeat: number of timed runs of each case
+    seed: seed of the synthetic graphs
+    N: numerosity of top nodes by degree used by funct_3, funct_4 and funct_5
+    citation_path: path of the real citation graph, skipped if None or missing
+    log: file-like object where progress is written, nothing is written if None
+
+    output
+    report: dictionary with the benchmark metadata and one result per (case, graph)
+    '''
+    cases = make_cases(N)
+    if functions is not None:
+        cases = {name: cases[name] for name in functions}
+
+    results = []
+    for label, kind, G in graphs(sizes, seed, citation_path):
+        for name, (kinds, prepare, check) in cases.items():
+            if kind not in kinds:
+                continue
+            run = prepare(G)
+            if run is None:
+                if log is not None:
+                    print(f"{name:>14} {label:>24}    skipped", file = log, flush = True)
+                continue
+            result = {
+                'case': name,
+                'graph': label,
+                'nodes': G.number_of_nodes(),
+                'edges': G.number_of_edges(),
+            }
+            try:
+                times, peak, retained = measure(run, repeat, check)
+            except CaseFailed as e:
+                result['error'] = str(e)
+                results.append(result)
+                if log is not None:
+                    print(f"{name:>14} {label:>24}     FAILED {e}", file = log, flush = True)
+                continue
+            result.update({
+                'time': statistics.median(times),
+                'times': times,
+                'peak_memory': peak,
+                'retained_memory': retained,
+            })
+            results.append(result)
+            if log is not None:
+                print(f"{name:>14} {label:>24} {statistics.median(times):10.4f}s {peak/2**20:10.1f}MiB {retained/2**20:10.1f}MiB retained",
+                      file = log, flush = True)
+        del G
+
+    meta = {
+        'python': platform.python_version(),
+        'networkx': nx.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'seed': seed,
+        'repeat': repeat,
+        'N': N,
+    }
+    return {'meta': meta, 'results': results}
+
+### REGRESSION CHECK ###
+def compare(report, baseline, threshold = 0.2):
+    '''
+    input
+    report: the output of run_benchmarks
+    baseline: a previous output of run_benchmarks
+    threshold: relative slowdown (or memory growth) tolerated, 0.2 means 20%
+
+    output
+    regressions: list of dictionaries describing every measure beyond the threshold
+    '''
+    previous = {(r['case'], r['graph']): r for r in baseline['results']}
+    regressions = []
+    for r in report['results']:
+        old = previous.get((r['case'], r['graph']))
+        if old is None or 'error' in old:
+            continue
+        if 'error' in r:
+            regressions.append({'case': r['case'], 'graph': r['graph'], 'metric': 'error', 'current': r['error']})
+            continue
+        for metric in ('time', 'peak_memory', 'retained_memory'):
+            # baselines written before retained_memory was measured do not have it
+            if metric not in old:
+                continue
+            if old[metric] > 0 and r[metric] > old[metric]*(1 + threshold):
+                regressions.append({
+                    'case': r['case'],
+                    'graph': r['graph'],
+                    'metric': metric,
+                    'baseline': old[metric],
+                    'current': r[metric],
+                    'ratio': r[metric]/old[metric],
+                })
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the backend functionalities.')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = SIZES, help = 'numbers of edges of the synthetic graphs')
+    parser.add_argument('--functions', nargs = '+', default = None, help = 'cases to run (default: all)')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'timed runs per case')
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed of the synthetic graphs')
+    parser.add_argument('-N', type = int, default = 100, help = 'top N nodes used by funct_3, funct_4 and funct_5')
+    parser.add_argument('--citation', default = CITATION_PATH, help = 'path of the citation graph (empty to skip)')
+    parser.add_argument('--output', default = None, help = 'JSON file where results are written (default: stdout)')
+    parser.add_argument('--baseline', default = None, help = 'JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type = float, default = 0.2, help = 'tolerated relative regression')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(sizes = args.sizes, functions = args.functions, repeat = args.repeat, seed = args.seed,
+                            N = args.N, citation_path = args.citation or None, log = sys.stderr)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(report, baseline, args.threshold)
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent = 2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 2)
+
+    # Fail if any case failed or any measure regressed beyond the threshold
+    failed = [r for r in report['results'] if 'error' in r]
+    for r in failed:
+        print(f"FAILED {r['case']} on {r['graph']}: {r['error']}", file = sys.stderr)
+    for r in report.get('regressions', []):
+        if r['metric'] != 'error':
+            print(f"REGRESSION {r['case']} on {r['graph']}: {r['metric']} x{r['ratio']:.2f}", file = sys.stderr)
+    return 1 if failed or report.get('regressions') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,463 @@
+import json
+import os
+import xml.etree.ElementTree as ET
+from array import array
+import numpy as np
+import networkx as nx
+from .graphformat import NODE_LABELS, EDGE_WEIGHT, EDGE_LABEL, encode_strings, decode_string, intern_strings, sorted_csr
+
+### STRING POOLS ###
+def write_pool(directory, name, strings):
+    '''
+    Stores a list of strings as one utf-8 blob and an array of offsets,
+    so that the pool can be memory-mapped and decoded one string at a time
+    '''
+    offsets, blob = encode_strings(strings)
+    np.save(os.path.join(directory, name + '_offsets.npy'), offsets)
+    np.save(os.path.join(directory, name + '_blob.npy'), blob)
+
+class Pool:
+    '''
+    Read-only view of a string pool written by write_pool
+    '''
+    def __init__(self, directory, name):
+        self.offsets = np.load(os.path.join(directory, name + '_offsets.npy'), mmap_mode = 'r')
+        self.blob = np.load(os.path.join(directory, name + '_blob.npy'), mmap_mode = 'r')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return decode_string(self.offsets, self.blob, i)
+
+### MEMORY-MAPPED EDGE STORE ###
+class EdgeStore:
+    '''
+    External-memory graph: the adjacency lives on disk as sorted CSR arrays that are memory-mapped,
+    so only the pages actually touched are brought into RAM. Undirected graphs are stored with both
+    directions of every edge, directed graphs with an extra CSR of the incoming edges.
+
+    Files in the directory:
+    meta.json                        directed, number of nodes and edges, node label name
+    out_indptr.npy, out_indices.npy  CSR of the (outgoing) neighbours, sorted by node index
+    in_indptr.npy, in_indices.npy    CSR of the incoming neighbours (directed graphs only)
+    weights.npy, edge_labels.npy     edge weight and label handle, aligned with out_indices
+    out_ranks.npy, in_ranks.npy      position of every neighbour in the adjacency order of the source graph
+    node_labels.npy                  label handle of every node
+    ids_*, node_pool_*, edge_pool_*  string pools of node ids, node labels and edge labels
+
+    Build it once with EdgeStore.from_graphml (streaming, the graph is never loaded in networkx)
+    or EdgeStore.from_graph, then reopen it with EdgeStore(directory).
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(directory, name + '.npy'), mmap_mode = 'r')
+        self.directed = self.meta['directed']
+        self.out_indptr = load('out_indptr')
+        self.out_indices = load('out_indices')
+        if self.directed:
+            self.in_indptr = load('in_indptr')
+            self.in_indices = load('in_indices')
+        self.weights = load('weights') if self.meta['weights'] else None
+        self.edge_labels = load('edge_labels') if self.meta['edge_labels'] else None
+        self.node_labels = load('node_labels') if self.meta['node_label'] else None
+        # stores written before the ranks were recorded keep the neighbours in index order
+        self.out_ranks = load('out_ranks') if self.meta.get('ranks') else None
+        self.in_ranks = load('in_ranks') if self.meta.get('ranks') and self.directed else None
+        self.ids = Pool(directory, 'ids')
+        self.node_pool = Pool(directory, 'node_pool')
+        self.edge_pool = Pool(directory, 'edge_pool')
+        self._index = None
+
+    ### BUILDING ###
+    @classmethod
+    def build(cls, directory, ids, sources, targets, directed, node_label = None, node_labels = None, weights = None, edge_labels = None,
+              ranks = None, reverse_ranks = None, node_pool = None, edge_pool = None):
+        '''
+        input
+        directory: output directory
+        ids: list of the node ids (strings)
+        sources, targets: integer arrays with the endpoints of every edge (indices into ids)
+        directed: boolean
+        node_label: name of the node label attribute ('title' or 'author_name'), None if absent
+        node_labels: list with the label of every node, or None
+        weights: array with the weight of every edge, or None
+        edge_labels: list with the label of every edge, or None
+        ranks: position of every target among the neighbours of its source in the source graph
+               (None means the order of the edges, as in a .graphml file)
+        reverse_ranks: position of every source among the (incoming) neighbours of its target, or None
+        node_pool, edge_pool: if given, node_labels and edge_labels are already interned as handles
+                              into these lists of strings (-1 for a missing label)
+
+        output
+        the EdgeStore opened on the directory
+        '''
+        os.makedirs(directory, exist_ok = True)
+        n = len(ids)
+        sources = np.asarray(sources, dtype = np.int64)
+        targets = np.asarray(targets, dtype = np.int64)
+        m = len(sources)
+        save = lambda name, a: np.save(os.path.join(directory, name + '.npy'), a)
+        index_dtype = np.int32 if n < 2**31 else np.int64
+
+        if edge_pool is not None:
+            edge_handles = np.asarray(edge_labels, dtype = np.int32) if edge_labels is not None else None
+        else:
+            edge_handles, edge_pool = intern_strings(edge_labels) if edge_labels is not None else (None, [])
+        weights = np.asarray(weights, dtype = np.float64) if weights is not None else None
+        ranks = np.arange(m, dtype = np.int64) if ranks is None else np.asarray(ranks, dtype = np.int64)
+        reverse_ranks = np.arange(m, dtype = np.int64) if reverse_ranks is None else np.asarray(reverse_ranks, dtype = np.int64)
+        if not directed:
+            # both directions of every edge
+            sources, targets = np.concatenate([sources, targets]), np.concatenate([targets, sources])
+            ranks = np.concatenate([ranks, reverse_ranks])
+            if weights is not None:
+                weights = np.concatenate([weights, weights])
+            if edge_handles is not None:
+                edge_handles = np.concatenate([edge_handles, edge_handles])
+
+        # CSR of the outgoing edges, neighbours sorted by index
+        indptr, indices, order = sorted_csr(sources, targets, n, index_dtype)
+        save('out_indptr', indptr)
+        save('out_indices', indices)
+        save('out_ranks', ranks[order])
+        if weights is not None:
+            save('weights', weights[order])
+        if edge_handles is not None:
+            save('edge_labels', edge_handles[order])
+        if directed:
+            indptr, indices, order = sorted_csr(targets, sources, n, index_dtype)
+            save('in_indptr', indptr)
+            save('in_indices', indices)
+            save('in_ranks', reverse_ranks[order])
+        del indptr, indices, order
+
+        write_pool(directory, 'ids', ids)
+        if node_pool is not None:
+            node_handles = np.asarray(node_labels, dtype = np.int32) if node_labels is not None else None
+        else:
+            node_handles, node_pool = intern_strings(node_labels) if node_labels is not None else (None, [])
+        if node_handles is not None:
+            save('node_labels', node_handles)
+        write_pool(directory, 'node_pool', node_pool)
+        write_pool(directory, 'edge_pool', edge_pool)
+
+        meta = {
+            'directed': bool(directed),
+            'nodes': n,
+            'edges': m,
+            'node_label': node_label if node_labels is not None else None,
+            'weights': weights is not None,
+            'edge_labels': edge_handles is not None,
+            'ranks': True,
+        }
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        return cls(directory)
+
+    @classmethod
+    def from_graph(cls, G, directory):
+        '''
+        Builds the store from a networkx graph (node and adjacency orders are kept, so ties in the
+        top N and in the algorithms on the top N subgraph match the backend)
+        '''
+        ids = [str(x) for x in G.nodes()]
+        index = {x: i for i, x in enumerate(G.nodes())}
+        nodes_data = [d for _, d in G.nodes(data = True)]
+        node_label = next((a for a in NODE_LABELS if any(a in d for d in nodes_data)), None)
+        node_labels = [d.get(node_label) for d in nodes_data] if node_label else None
+        del nodes_data
+        sources = np.fromiter((index[u] for u, v in G.edges()), dtype = np.int64, count = G.number_of_edges())
+        targets = np.fromiter((index[v] for u, v in G.edges()), dtype = np.int64, count = G.number_of_edges())
+        succ = G.succ if G.is_directed() else G.adj
+        pred = G.pred if G.is_directed() else G.adj
+        position = {u: {v: i for i, v in enumerate(nbrs)} for u, nbrs in succ.items()}
+        ranks = np.fromiter((position[u][v] for u, v in G.edges()), dtype = np.int64, count = G.number_of_edges())
+        if G.is_directed():
+            position = {v: {u: i for i, u in enumerate(nbrs)} for v, nbrs in pred.items()}
+        reverse_ranks = np.fromiter((position[v][u] for u, v in G.edges()), dtype = np.int64, count = G.number_of_edges())
+        del position
+        edges_data = [d for _, _, d in G.edges(data = True)]
+        weights = [d.get(EDGE_WEIGHT, 1.0) for d in edges_data] if any(EDGE_WEIGHT in d for d in edges_data) else None
+        edge_labels = [d.get(EDGE_LABEL) for d in edges_data] if any(EDGE_LABEL in d for d in edges_data) else None
+        return cls.build(directory, ids, sources, targets, G.is_directed(), node_label, node_labels, weights, edge_labels,
+                         ranks, reverse_ranks)
+
+    @classmethod
+    def from_graphml(cls, path, directory):
+        '''
+        Builds the store by streaming a .graphml file: edges and label handles are accumulated in
+        compact integer arrays, every element is dropped once parsed and the networkx graph is never built
+        '''
+        ns = '{http://graphml.graphdrawing.org/xmlns}'
+        keys = {}
+        index = {}
+        ids = []
+        node_labels = array('i')
+        node_pool = {}
+        node_label = None
+        graph = None
+        directed = True
+        sources, targets, weights = array('q'), array('q'), array('d')
+        edge_labels = array('i')
+        edge_pool = {}
+        has_weights = has_labels = False
+
+        def node_index(x):
+            if x not in index:
+                index[x] = len(ids)
+                ids.append(x)
+                node_labels.append(-1)
+            return index[x]
+
+        for event, elem in ET.iterparse(path, events = ('start', 'end')):
+            tag = elem.tag.replace(ns, '')
+            if event == 'start':
+                if tag == 'graph':
+                    graph = elem
+                    directed = elem.get('edgedefault', 'directed') == 'directed'
+                continue
+            if tag == 'key':
+                keys[elem.get('id')] = elem.get('attr.name')
+            elif tag == 'node':
+                i = node_index(elem.get('id'))
+                for data in elem.iter(ns + 'data'):
+                    name = keys.get(data.get('key'))
+                    if name in NODE_LABELS:
+                        node_label = name
+                        node_labels[i] = node_pool.setdefault(data.text or '', len(node_pool))
+            elif tag == 'edge':
+                sources.append(node_index(elem.get('source')))
+                targets.append(node_index(elem.get('target')))
+                weight, label = 1.0, -1
+                for data in elem.iter(ns + 'data'):
+                    name = keys.get(data.get('key'))
+                    if name == EDGE_WEIGHT:
+                        weight, has_weights = float(data.text), True
+                    elif name == EDGE_LABEL:
+                        label, has_labels = edge_pool.setdefault(data.text or '', len(edge_pool)), True
+                weights.append(weight)
+                edge_labels.append(label)
+            else:
+                continue
+            # the parsed elements stay attached to <graph> until they are removed from it
+            elem.clear()
+            if graph is not None:
+                del graph[:]
+
+        # the lookup tables are not needed by build
+        del index
+        node_pool, edge_pool = list(node_pool), list(edge_pool)
+        return cls.build(directory, ids, np.frombuffer(sources, dtype = np.int64), np.frombuffer(targets, dtype = np.int64), directed,
+                         node_label, np.frombuffer(node_labels, dtype = np.int32) if node_label else None,
+                         np.frombuffer(weights, dtype = np.float64) if has_weights else None,
+                         np.frombuffer(edge_labels, dtype = np.int32) if has_labels else None,
+                         node_pool = node_pool, edge_pool = edge_pool)
+
+    ### BASIC QUERIES ###
+    def number_of_nodes(self):
+        return self.meta['nodes']
+
+    def number_of_edges(self):
+        return self.meta['edges']
+
+    def index(self, node):
+        '''
+        Index of a node id. The id -> index table is built on first use (it is O(|V|), not O(|E|))
+        '''
+        if self._index is None:
+            self._index = {self.ids[i]: i for i in range(len(self.ids))}
+        return self._index.get(str(node))
+
+    def label(self, i):
+        if self.node_labels is None or self.node_labels[i] < 0:
+            return None
+        return self.node_pool[self.node_labels[i]]
+
+    def out_degree(self):
+        return np.diff(self.out_indptr)
+
+    def in_degree(self):
+        return np.diff(self.in_indptr) if self.directed else self.out_degree()
+
+    def degree(self):
+        '''
+        Degree of every node, as networkx counts it (in + out for directed graphs)
+        '''
+        return self.out_degree() + self.in_degree() if self.directed else self.out_degree()
+
+    def neighbors(self, node):
+        '''
+        Ids of the (outgoing) neighbours of a node, like nx.neighbors
+        '''
+        i = self.index(node)
+        return [self.ids[j] for j in self.out_indices[self.out_indptr[i]:self.out_indptr[i+1]]]
+
+    def edge_position(self, i, j):
+        '''
+        Position of the edge (i,j) in out_indices, found by binary search, or None
+        '''
+        start, stop = self.out_indptr[i], self.out_indptr[i+1]
+        k = start + np.searchsorted(self.out_indices[start:stop], j)
+        return k if k < stop and self.out_indices[k] == j else None
+
+    ### FUNCTIONALITY 1 ###
+    def degree_statistics(self, G_name):
+        '''
+        Out-of-core version of funct_1: the node and edge lists are not materialised
+
+        input
+        G_name: 'citation' or 'collaboration'
+
+        output
+        dictionary with n, m, density, average_deg, degrees (array), percentile_95,
+        hubs (list of (node, label, degree)), is_sparse and, for the citation graph,
+        degrees_in and degrees_out (arrays aligned with the node indices)
+        '''
+        n, m = self.number_of_nodes(), self.number_of_edges()
+        density = m/(n*(n-1)) if G_name.lower() == 'citation' else 2*m/(n*(n-1))
+        degrees = self.degree()
+        percentile_95 = np.percentile(degrees, 95)
+        hubs = [(self.ids[i], self.label(i), int(degrees[i])) for i in np.flatnonzero(degrees > percentile_95)]
+        stats = {
+            'n': n,
+            'm': m,
+            'density': density,
+            'average_deg': 2*m/n,
+            'degrees': degrees,
+            'percentile_95': percentile_95,
+            'hubs': hubs,
+            'is_sparse': density < 0.5,
+        }
+        if G_name.lower() == 'citation':
+            stats['degrees_in'] = self.in_degree()
+            stats['degrees_out'] = self.out_degree()
+        return stats
+
+    ### BFS ###
+    def bfs(self, source, target = None):
+        '''
+        Level-synchronous BFS over the (outgoing) neighbours, vectorised on the CSR arrays.
+        The neighbours of every node are expanded in the adjacency order of the source graph
+        (out_ranks), so the BFS parents, and the paths, are the ones of the backend shortest_path
+
+        input
+        source: index of the starting node
+        target: index of a node where the search can stop early, or None
+
+        output
+        previous: int64 array with the BFS parent of every node (-1 if not reached, source has itself)
+        '''
+        previous = np.full(self.number_of_nodes(), -1, dtype = np.int64)
+        previous[source] = source
+        frontier = np.array([source], dtype = np.int64)
+        while len(frontier) and (target is None or previous[target] < 0):
+            starts = self.out_indptr[frontier]
+            counts = self.out_indptr[frontier + 1] - starts
+            total = int(counts.sum())
+            if total == 0:
+                break
+            # positions of all the neighbours of the frontier, in frontier order
+            positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+            if self.out_ranks is not None:
+                owners = np.repeat(np.arange(len(frontier)), counts)
+                positions = positions[np.lexsort((self.out_ranks[positions], owners))]
+            neighbors = np.asarray(self.out_indices[positions], dtype = np.int64)
+            parents = np.repeat(frontier, counts)
+            new = previous[neighbors] < 0
+            neighbors, parents = neighbors[new], parents[new]
+            # keep the first discovery of every node, in discovery order
+            first = np.sort(np.unique(neighbors, return_index = True)[1])
+            frontier = neighbors[first]
+            previous[frontier] = parents[first]
+        return previous
+
+    def shortest_path(self, starting_node, finish_node):
+        '''
+        Out-of-core version of the backend shortest_path (unweighted)
+
+        output
+        path: list of node ids from starting_node to finish_node
+        papers: list of the labels of the edges along the path
+        '''
+        s, t = self.index(starting_node), self.index(finish_node)
+        if s is None or t is None:
+            print("Nodes not in the graph")
+            return 1
+        previous = self.bfs(s, t)
+        if previous[t] < 0:
+            print(f"There is no such path between node {starting_node} and {finish_node}.")
+            return [],[]
+        path = [t]
+        while path[-1] != s:
+            path.append(int(previous[path[-1]]))
+        path = path[::-1]
+        papers = []
+        if self.edge_labels is not None:
+            for i, j in zip(path[:-1], path[1:]):
+                k = self.edge_position(i, j)
+                papers.append(self.edge_pool[self.edge_labels[k]] if self.edge_labels[k] >= 0 else None)
+        return [self.ids[i] for i in path], papers
+
+    ### TOP N SUBGRAPH ###
+    def top_nodes(self, N):
+        '''
+        Indices of the top N nodes by degree, with ties broken by node order as in the backend
+        '''
+        return np.argsort(-self.degree(), kind = 'stable')[:N]
+
+    def top_subgraph(self, N):
+        '''
+        input
+        N: numerosity of top nodes by degree to consider
+
+        output
+        G: networkx graph induced by the top N nodes by degree, with labels and weights.
+           Only this subgraph is loaded in memory, so it can be passed to funct_3, funct_4 or funct_5.
+           Nodes are in the order of the source graph and every adjacency in the order of the source
+           adjacency, so algorithms that break ties by iteration order (e.g. the Girvan-Newman edge
+           removals of funct_5) give the same results as on the in-memory graph.
+        '''
+        top = np.sort(self.top_nodes(N))
+        selected = np.zeros(self.number_of_nodes(), dtype = bool)
+        selected[top] = True
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        label = self.meta['node_label']
+        ids = {}
+        for i in top:
+            ids[i] = self.ids[i]
+            G.add_node(ids[i], **({label: self.label(i)} if label else {}))
+
+        # The adjacency dictionaries are filled directly: add_edge appends to both endpoints at once,
+        # which cannot reproduce the two adjacency orders of the source graph.
+        # One attribute dictionary per edge, shared by both directions as networkx does.
+        data = {}
+        succ = G._succ if self.directed else G._adj
+        for i in top:
+            start, stop = self.out_indptr[i], self.out_indptr[i+1]
+            positions = start + np.flatnonzero(selected[np.asarray(self.out_indices[start:stop])])
+            if self.out_ranks is not None:
+                positions = positions[np.argsort(self.out_ranks[positions], kind = 'stable')]
+            for k in positions:
+                j = int(self.out_indices[k])
+                key = (i, j) if self.directed else (min(i, j), max(i, j))
+                d = data.get(key)
+                if d is None:
+                    d = data[key] = {}
+                    if self.weights is not None:
+                        d[EDGE_WEIGHT] = float(self.weights[k])
+                    if self.edge_labels is not None and self.edge_labels[k] >= 0:
+                        d[EDGE_LABEL] = self.edge_pool[self.edge_labels[k]]
+                succ[ids[i]][ids[j]] = d
+        if self.directed:
+            for j in top:
+                start, stop = self.in_indptr[j], self.in_indptr[j+1]
+                positions = start + np.flatnonzero(selected[np.asarray(self.in_indices[start:stop])])
+                if self.in_ranks is not None:
+                    positions = positions[np.argsort(self.in_ranks[positions], kind = 'stable')]
+                for k in positions:
+                    i = int(self.in_indices[k])
+                    G._pred[ids[j]][ids[i]] = data[(i, j)]
+        return G
@@ -1,4 +1,6 @@
 from .backend import *
+from .tracing import traced, stage
+from .service import RemoteGraph
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import numpy as np
@@ -7,7 +9,34 @@ import networkx as nx
 from IPython.display import display
 from itables import show
 
+### HELPERS ###
+def _call(func, G, *args):
+    '''
+    Runs a backend function on G. If G is a RemoteGraph the function runs on the query service instead.
+    '''
+    if isinstance(G, RemoteGraph):
+        return G.call(func.__name__, *args)
+    return func(G, *args)
+
+def _neighbourhood(G, N, seeds, k, cap):
+    '''
+    input
+    G: the graph data (networkx graph or RemoteGraph)
+    N: numerosity of top nodes by degree to consider
+    seeds: list of nodes to focus on
+    k: number of hops around the seeds
+    cap: maximum number of nodes added at every hop, by degree
+    
+    output
+    G_ego: k-hop neighbourhood of the seeds inside the subgraph of G induced by the top N nodes by degree.
+           Only this region is laid out and drawn, so the drawings cost the same for every N.
+    '''
+    if isinstance(G, RemoteGraph):
+        return G.neighbourhood(N, seeds, k, cap)
+    return k_hop_subgraph(top_n_subgraph(G, N), seeds, k, cap)
+
 ### FUNCTIONALITY 1 VISUALIZATION ###
+@traced
 def visual_1(G,k):
     '''
     Prints two tables, showing informations about the graph and the list of the hub nodes. 
@@ -27,7 +56,7 @@ def visual_1(G,k):
     if nx.is_directed(G):
         G_name = 'citation'
         # Apply functionality 1 to retrieve needed data
-        n, e, dens, degs, degs_in, degs_out, avg_deg, perc_95, hubs, is_sparse = funct_1(G, G_name)
+        n, e, dens, degs, degs_in, degs_out, avg_deg, perc_95, hubs, is_sparse = _call(funct_1, G, G_name)
         # Store hubs info in pandas dataframe
         degs_in_df = pd.DataFrame(degs_in.items(), columns = ['ID', 'In Degree'])
         degs_out_df = pd.DataFrame(degs_out.items(), columns = ['ID', 'Out Degree'])
@@ -40,13 +69,16 @@ def visual_1(G,k):
     else:
         G_name = 'collaboration'
         # Apply functionality 1 to retrieve needed data
-        n, e, dens, degs, avg_deg, perc_95, hubs, is_sparse = funct_1(G, G_name)
+        n, e, dens, degs, avg_deg, perc_95, hubs, is_sparse = _call(funct_1, G, G_name)
         # Store hubs info in pandas dataframe
         hubs_info = pd.DataFrame(hubs, columns = ['ID', 'Name', 'Degree']).sort_values('Degree', ascending = False)
     
     # Store graph info in pandas dataframe
+    # (the query service sends the numbers of nodes and edges instead of the lists)
+    num_nodes = n if isinstance(n, int) else len(n)
+    num_edges = e if isinstance(e, int) else len(e)
     colnames = ['Number of Nodes', 'Number of Edges', 'Density', 'Average Degree', 'Is Sparse']
-    graph_info = pd.DataFrame(np.array([[len(n), len(e), round(dens,4), round(avg_deg,3), is_sparse]]), columns = colnames)
+    graph_info = pd.DataFrame(np.array([[num_nodes, num_edges, round(dens,4), round(avg_deg,3), is_sparse]]), columns = colnames)
     graph_info['Is Sparse'] = graph_info['Is Sparse'].astype('bool') 
     
     # Change dataframes style to display prettier tables
@@ -125,6 +157,7 @@ def visual_1(G,k):
     return None
 
 ### NODE ID FINDER VISUALIZATION###
+@traced
 def visual_id_finder(G,input_str):
     '''
     Prints a node ID given the author's name of the paper's title
@@ -137,7 +170,7 @@ def visual_id_finder(G,input_str):
     None
     '''
     # Use the ID finder
-    ids = id_finder(G,input_str)
+    ids = _call(id_finder, G, input_str)
     
     # Handle cases in which there is no node with the typed name/title
     if ids == []:
@@ -167,6 +200,7 @@ def visual_id_finder(G,input_str):
     return None
 
 ### FUNCTIONALITY 2 VISUALIZATION ###
+@traced
 def visual_2(G,v):
     '''
     Prints one table that displays four centrality measures calculated for an input node.
@@ -187,14 +221,14 @@ def visual_2(G,v):
     if nx.is_directed(G):
         G_name = 'citation'
         # Calculate centrality measures - Apply Functionality 2
-        bet, pr, cc, dc = funct_2(G,str(v),G_name)
+        bet, pr, cc, dc = _call(funct_2, G, str(v), G_name)
         # Create a dataframe to store the calculated measures
         colnames = ['Betweenness Centrality', 'PageRank Centrality', 'Closeness Centrality', 'Degree Centrality (In)', 'Degree Centrality (Out)']
         node_info = pd.DataFrame(np.array([[bet, pr, cc, dc[0], dc[1]]]), columns = colnames)
     else:
         G_name = 'collaboration'
         # Calculate centrality measures - Apply Functionality 2
-        bet, pr, cc, dc = funct_2(G,str(v),G_name)
+        bet, pr, cc, dc = _call(funct_2, G, str(v), G_name)
         # Create a dataframe to store the calculated measures
         colnames = ['Betweenness Centrality', 'PageRank Centrality', 'Closeness Centrality', 'Degree Centrality']
         node_info = pd.DataFrame(np.array([[bet, pr, cc, dc]]), columns = colnames)
@@ -221,7 +255,8 @@ def visual_2(G,v):
     return None
 
 ### FUNCTIONALITY 3 VISUALIZATION ###
-def visual_3(G,a1,a,an,N):
+@traced
+def visual_3(G,a1,a,an,N,k=1,cap=20):
     '''
     input
     G: the graph data
@@ -229,6 +264,8 @@ def visual_3(G,a1,a,an,N):
     a: string that is a sequence of authors  [a2,a3,...,an-1] separated by a blank space
     an: finish node
     N: numerosity of top authors by degree to consider
+    k: number of hops drawn around the walk
+    cap: maximum number of authors drawn at every hop (the ones with highest degree)
     
     output
     None
@@ -238,7 +275,7 @@ def visual_3(G,a1,a,an,N):
     a = a.split(' ')
     
     # Calculate the shortest path - Apply Functionality 3
-    path, papers = funct_3(G,a,str(a1),str(an),N)
+    path, papers = _call(funct_3, G, a, str(a1), str(an), N)
     path_from = path[:-1]
     path_to = path[1:]
     path_papers = [list(x) for x in zip(path_from, path_to, papers)]
@@ -262,13 +299,12 @@ def visual_3(G,a1,a,an,N):
      }], overwrite = False)\
     .hide(axis = 'index')
     
-    display(walk_df_stl)
+    with stage('table'):
+        display(walk_df_stl)
     
     # --- Visualization on graph ---
-    #Compute the subgraph of G induced by the top N nodes by degree
-    degrees = dict(G.degree())
-    sorted_nodes = [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)]
-    G_sub = G.subgraph(sorted_nodes[:N])
+    #Compute the neighbourhood of the walk in the subgraph of G induced by the top N nodes by degree
+    G_sub = _neighbourhood(G, N, path, k, cap)
     # Compute a list of edges involved in the path
     path_edges = list(zip(path_from, path_to))
     # Compute a dictionary where edges in path are keys and papers are values
@@ -277,46 +313,39 @@ def visual_3(G,a1,a,an,N):
     # Initialize MatPlotLib figure
     plt.figure(figsize=(12, 8))
     # Use spring layout
-    pos = nx.spring_layout(G_sub)
-    
-    # Draw nodes and edges not included in path
-    nx.draw_networkx_nodes(G_sub, pos, nodelist=set(G_sub.nodes)-set(path), node_size = 50)
-    nx.draw_networkx_edges(G_sub, pos, edgelist=set(G_sub.edges)-set(path_edges), edge_color='gray', node_size = 50)
-    
-    # Draw nodes and edges included in path
-    nx.draw_networkx_nodes(G_sub, pos, nodelist=path, node_color='r', node_size = 50)
-    nx.draw_networkx_edges(G_sub, pos, edgelist=path_edges, edge_color='r', node_size = 50)
-    
-    # Draw labels
-    nx.draw_networkx_edge_labels(G_sub, pos, edge_labels = labels)
-    
-    # Zoom on the nodes of interest
-    pos_path = {k:pos[str(k)] for k in path}
-    xmin = min(xx for xx,yy in pos_path.values())
-    xmax = max(xx for xx,yy in pos_path.values())
-    xrange = xmax-xmin
-    ymin = min(yy for xx,yy in pos_path.values())
-    ymax = max(yy for xx,yy in pos_path.values())
-    yrange = ymax-ymin
-    axis = plt.gca()
-    axis.set_xlim(left = xmin - 0.1*xrange, right = xmax + 0.1*xrange)
-    axis.set_ylim(bottom = ymin - 0.1*yrange, top = ymax + 0.1*yrange)
+    with stage('layout', nodes = G_sub.number_of_nodes()):
+        pos = nx.spring_layout(G_sub)
+    
+    with stage('draw'):
+        # Draw nodes and edges not included in path
+        nx.draw_networkx_nodes(G_sub, pos, nodelist=set(G_sub.nodes)-set(path), node_size = 50)
+        nx.draw_networkx_edges(G_sub, pos, edgelist=set(G_sub.edges)-set(path_edges), edge_color='gray', node_size = 50)
+        
+        # Draw nodes and edges included in path
+        nx.draw_networkx_nodes(G_sub, pos, nodelist=path, node_color='r', node_size = 50)
+        nx.draw_networkx_edges(G_sub, pos, edgelist=path_edges, edge_color='r', node_size = 50)
+        
+        # Draw labels
+        nx.draw_networkx_edge_labels(G_sub, pos, edge_labels = labels)
     
     #nx.draw(G, pos, node_size=10, edge_color='gray', with_labels=False)
-    plt.title("Zoomed graph with shortest walk highlighted")
+    plt.title(f"Neighbourhood ({k} hops) of the shortest walk, highlighted")
     plt.tight_layout()
     plt.show()
     
     return None
     
 ### FUNCTIONALITY 4 VISUALIZATION ###
-def visual_4(G,authorA,authorB,N):
+@traced
+def visual_4(G,authorA,authorB,N,k=1,cap=20):
     '''
     input
     G: the graph data
     authorA: the id of the first node which will be in the first sub-graph
     authorB: the id of the second node which will be in the second sub-graph
     N: numerosity of top authors by degree to consider
+    k: number of hops drawn around the two authors and the cut edges
+    cap: maximum number of authors drawn at every hop (the ones with highest degree)
     
     output
     None
@@ -324,28 +353,30 @@ def visual_4(G,authorA,authorB,N):
     # Split the original graph in two disconnected subgraphs, 
     # one containing node A and the other containing node B 
     # Apply Functionality 4 to do so
-    min_weight, partition, edge_cut_list = funct_4(G,authorA,authorB,N)
+    min_weight, partition, edge_cut_list = _call(funct_4, G, authorA, authorB, N)
     nedge_cut = len(edge_cut_list)
     
     # --- Print the number of links that should be disconnected ---
     print(f'A minimum of {nedge_cut} edges with an overall weight of {min_weight} need to be removed in order to split the graph in the two following (disconnected) sub-graphs')
     
     # --- Visualization on graph ---
-    #Compute the subgraph induced by the top N nodes by degree
-    degrees = dict(G.degree())
-    sorted_nodes = [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)]
-    G_sub = G.subgraph(sorted_nodes[:N])
+    #Compute the neighbourhood of the two authors and of the endpoints of the cut edges
+    #in the subgraph induced by the top N nodes by degree
+    seeds = [authorA, authorB] + [node for edge in edge_cut_list for node in edge]
+    G_sub = _neighbourhood(G, N, seeds, k, cap)
     
     # Now, let's plot the induced sub-graph
     # Initialize MatPlotLib figure
     fig, axes = plt.subplots(nrows = 2, ncols = 1, figsize=(12, 10))
     # Use spring layout
-    pos = nx.spring_layout(G_sub)
+    with stage('layout', nodes = G_sub.number_of_nodes()):
+        pos = nx.spring_layout(G_sub)
     
     # Plot the original graph
-    nx.draw_networkx(G_sub, pos = pos, with_labels = False, edge_color = 'gray', node_size = 30, ax = axes[0])
+    with stage('draw'):
+        nx.draw_networkx(G_sub, pos = pos, with_labels = False, edge_color = 'gray', node_size = 30, ax = axes[0])
     
-    axes[0].set_title("Collaboration sub-graph")
+    axes[0].set_title(f"Collaboration sub-graph around the cut ({k} hops)")
     
     # Let's plot the two disconnected sub-graphs
     # Remove the cut edges from the original subgraph
@@ -355,34 +386,10 @@ def visual_4(G,authorA,authorB,N):
     color_map = ['red' if node == authorA else '#00ff00' if node == authorB else '#1f78b4' for node in G_sub_cut] 
     size_map = [90 if node == authorA or node == authorB else 30 for node in G_sub_cut]
     # Draw the induced subgraph without the cut edges
-    pos = nx.spring_layout(G_sub_cut)
-    nx.draw_networkx(G_sub_cut, pos = pos, with_labels = False, edge_color = 'gray', node_color = color_map, node_size = size_map, ax = axes[1])
-    
-    # Check if authorA and authorB were originally in the same connected component
-    connected_components = list(nx.connected_components(G_sub))
-    in_same_component = any(authorA in component and authorB in component for component in connected_components)
-    
-    # Handle the visualization if they belonged to the same connected component or not
-    if in_same_component:
-        for i,comp in enumerate(connected_components):
-            if authorA in comp:
-                pos_path = {k:pos[k] for k in comp}
-    else:
-        pos_path = {}
-        for i,comp in enumerate(connected_components):
-            if (authorA in comp) or (authorB in comp):
-                pos_path.update({k:pos[k] for k in comp})
-    
-    # Zoom on the nodes of interest
-    xmin = min(xx for xx,yy in pos_path.values())
-    xmax = max(xx for xx,yy in pos_path.values())
-    xrange = xmax-xmin
-    ymin = min(yy for xx,yy in pos_path.values())
-    ymax = max(yy for xx,yy in pos_path.values())
-    yrange = ymax-ymin
-    axis = plt.gca()
-    axis.set_xlim(left = xmin - 0.1*xrange, right = xmax + 0.1*xrange)
-    axis.set_ylim(bottom = ymin - 0.1*yrange, top = ymax + 0.1*yrange)
+    with stage('layout', nodes = G_sub_cut.number_of_nodes()):
+        pos = nx.spring_layout(G_sub_cut)
+    with stage('draw'):
+        nx.draw_networkx(G_sub_cut, pos = pos, with_labels = False, edge_color = 'gray', node_color = color_map, node_size = size_map, ax = axes[1])
     
     # Setup legend to identify paper_1 and paper_2 communities
     legend_elements = [
@@ -399,19 +406,22 @@ def visual_4(G,authorA,authorB,N):
 
 
 ### FUNCTIONALITY 5 VISUALIZATION ###
-def visual_5(G,paper_1,paper_2,N):
+@traced
+def visual_5(G,paper_1,paper_2,N,k=1,cap=20):
     '''
     input
     G: the graph data
     paper_1, paper_2:  strings of paper_ids
     N: numerosity of top authors by degree to consider
+    k: number of hops drawn around the two papers
+    cap: maximum number of papers drawn at every hop (the ones with highest degree)
     
     output
     None
     '''
     # --- Communities in table ---
     # Find the communities - Apply functionality 5
-    num_links, communities, are_in_same_comm = funct_5(G,paper_1,paper_2,N)
+    num_links, communities, are_in_same_comm = _call(funct_5, G, paper_1, paper_2, N)
     
     # Stop if there are no communities (it means that one of the papers isn't in the induced subgraph)
     if communities == []:
@@ -446,36 +456,40 @@ def visual_5(G,paper_1,paper_2,N):
      }], overwrite = False)\
     .hide(axis = 'index')
     
-    show(comm_df_stl, classes="display compact")
+    with stage('table'):
+        show(comm_df_stl, classes="display compact")
     
     # --- Visualization on graph ---
-    #Compute the subgraph induced by the top N nodes by degree
-    degrees = dict(G.degree())
-    sorted_nodes = [k for k, v in sorted(degrees.items(), key=lambda x: x[1], reverse = True)]
-    G_sub = G.subgraph(sorted_nodes[:N])
+    #Compute the neighbourhood of the two papers in the subgraph induced by the top N nodes by degree
+    G_sub = _neighbourhood(G, N, [paper_1, paper_2], k, cap)
     
     # Now, let's plot the induced sub-graph
     # Initialize MatPlotLib figure
     fig, axes = plt.subplots(nrows = 2, ncols = 1, figsize=(12, 10))
     # Use spring layout
-    pos = nx.spring_layout(G_sub)
+    with stage('layout', nodes = G_sub.number_of_nodes()):
+        pos = nx.spring_layout(G_sub)
     
-    # Plot the original graph
-    nx.draw_networkx(G_sub, pos = pos, with_labels = False, edge_color = 'gray', node_size = 30, ax = axes[0])
-    
-    axes[0].set_title("Citation sub-graph")
-    
-    # Let's plot the same graph, with highlighted communities
-    # Draw the induced subgraph
-    nx.draw_networkx(G_sub, pos = pos, with_labels = False, edge_color = 'gray', node_size = 40, ax = axes[1])
-    # Re-draw the nodes with different colors (random) by belonging community
-    comm_cols = [tuple(np.random.choice(range(256), size=3)/256) for i in range(len(communities))]
-    for i,com in enumerate(communities):
-        if paper_1 in com:
-            paper_1_comm = i
-        if paper_2 in com:
-            paper_2_comm = i
-        nx.draw_networkx_nodes(G_sub, pos = pos, nodelist = G_sub.subgraph(com).nodes(), node_size = 40,node_color = comm_cols[i])
+    with stage('draw'):
+        # Plot the original graph
+        nx.draw_networkx(G_sub, pos = pos, with_labels = False, edge_color = 'gray', node_size = 30, ax = axes[0])
+        
+        axes[0].set_title(f"Citation sub-graph around the two papers ({k} hops)")
+        
+        # Let's plot the same graph, with highlighted communities
+        # Draw the induced subgraph
+        nx.draw_networkx(G_sub, pos = pos, with_labels = False, edge_color = 'gray', node_size = 40, ax = axes[1])
+        # Re-draw the nodes with different colors (random) by belonging community
+        comm_cols = [tuple(np.random.choice(range(256), size=3)/256) for i in range(len(communities))]
+        for i,com in enumerate(communities):
+            if paper_1 in com:
+                paper_1_comm = i
+            if paper_2 in com:
+                paper_2_comm = i
+            # Only the papers of the community that belong to the drawn neighbourhood
+            nodelist = [node for node in com if node in G_sub]
+            if nodelist:
+                nx.draw_networkx_nodes(G_sub, pos = pos, nodelist = nodelist, node_size = 40, node_color = [comm_cols[i]], ax = axes[1])
     
     # Setup legend to identify paper_1 and paper_2 communities
     legend_elements = [
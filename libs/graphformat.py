@@ -0,0 +1,103 @@
+import numpy as np
+
+# Attributes kept by the compact graph formats: the node label and the edge weight and label
+NODE_LABELS = ('title', 'author_name')
+EDGE_WEIGHT = 'weight'
+EDGE_LABEL = 'paper'
+
+### STRING POOLS ###
+def encode_strings(strings, count = None):
+    '''
+    input
+    strings: iterable of strings
+    count: number of strings (None if strings is a list or another sized collection)
+
+    output
+    offsets: int64 array of count + 1 offsets into the blob
+    blob: uint8 array with the utf-8 encoding of all the strings, one after the other
+    '''
+    if count is None:
+        count = len(strings)
+    encoded = bytearray()
+    offsets = np.zeros(count + 1, dtype = np.int64)
+    for i, s in enumerate(strings):
+        encoded += s.encode('utf-8')
+        offsets[i+1] = len(encoded)
+    return offsets, np.frombuffer(bytes(encoded), dtype = np.uint8)
+
+def decode_string(offsets, blob, i):
+    return blob[offsets[i]:offsets[i+1]].tobytes().decode('utf-8')
+
+def intern_strings(values):
+    '''
+    input
+    values: iterable of strings (or None)
+
+    output
+    handles: int32 array with one handle per value (-1 for None)
+    pool: list of the distinct strings, in order of first appearance
+    '''
+    table = {}
+    handles = np.fromiter((-1 if s is None else table.setdefault(s, len(table)) for s in values), dtype = np.int32)
+    return handles, list(table)
+
+### CSR ###
+def adjacency_csr(rows, row, index_dtype):
+    '''
+    CSR of an adjacency dictionary (G.succ, G.pred or G.adj), neighbours in the order of networkx
+    '''
+    lengths = np.fromiter((len(nbrs) for nbrs in rows.values()), dtype = index_dtype, count = len(rows))
+    indptr = np.zeros(len(rows) + 1, dtype = index_dtype)
+    np.cumsum(lengths, out = indptr[1:])
+    indices = np.fromiter((row[v] for nbrs in rows.values() for v in nbrs), dtype = index_dtype, count = int(indptr[-1]))
+    return indptr, indices
+
+def sort_rows(indptr, indices):
+    '''
+    Sorts the neighbours of every row of a CSR by index
+
+    output
+    indices: the sorted indices
+    order: the permutation of the entries, to align other per-entry arrays with indices
+    '''
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.lexsort((indices, rows))
+    return indices[order], order
+
+def sorted_csr(sources, targets, n, index_dtype):
+    '''
+    CSR of a list of edges, the neighbours of every row sorted by index
+
+    output
+    indptr: int64 array of n + 1 row offsets
+    indices: targets sorted by (source, target), as index_dtype
+    order: the permutation of the edges, to align other per-edge arrays with indices
+    '''
+    order = np.lexsort((targets, sources))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength = n))]).astype(np.int64)
+    return indptr, targets[order].astype(index_dtype), order
+
+### SHARED ATTRIBUTE VALUES ###
+def intern_attributes(G, node_keys = NODE_LABELS, edge_keys = (EDGE_LABEL,)):
+    '''
+    Makes the equal string attributes of G share one str object, as sys.intern does
+    (e.g. a paper repeated on every co-author pair is stored once). The values keep their content.
+
+    input
+    G: the graph data
+    node_keys, edge_keys: names of the attributes to share
+
+    output
+    distinct: number of distinct strings
+    values: number of attribute values pointing to them
+    '''
+    table = {}
+    values = 0
+    for data, keys in ((G.nodes(data = True), node_keys), (G.edges(data = True), edge_keys)):
+        for *_, d in data:
+            for key in keys:
+                value = d.get(key)
+                if type(value) is str:
+                    d[key] = table.setdefault(value, value)
+                    values += 1
+    return len(table), values
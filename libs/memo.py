@@ -0,0 +1,363 @@
+import collections
+import copy
+import functools
+import hashlib
+import inspect
+import numbers
+import os
+import pickle
+import shutil
+import weakref
+import numpy as np
+import networkx as nx
+from .graphformat import NODE_LABELS, EDGE_WEIGHT, EDGE_LABEL
+
+# Node and edge attributes read by the backend, the only ones that enter the fingerprint
+# (other attributes, e.g. a 'capacity' set by hand, do not change the results)
+NODE_ATTRIBUTES = NODE_LABELS
+EDGE_ATTRIBUTES = (EDGE_WEIGHT, EDGE_LABEL)
+
+### GRAPH FINGERPRINT ###
+def graph_fingerprint(G):
+    '''
+    input
+    G: the graph data
+
+    output
+    fingerprint: hex string that changes whenever nodes, edges or the attributes used
+                 by the backend change (including their order, which decides ties in the top N)
+    '''
+    h = hashlib.blake2b(digest_size = 16)
+    h.update(b'D' if G.is_directed() else b'U')
+    for node, d in G.nodes(data = True):
+        h.update(repr((node, [d.get(a) for a in NODE_ATTRIBUTES])).encode())
+    h.update(b'|')
+    for u, v, d in G.edges(data = True):
+        h.update(repr((u, v, [d.get(a) for a in EDGE_ATTRIBUTES])).encode())
+    return h.hexdigest()
+
+def graph_state(G):
+    '''
+    Cheap summary of G (O(1)): number of nodes and edges and version counter.
+    The version is bumped by every structural mutation of a graph passed to track_mutations;
+    on other graphs, edits that keep the state (e.g. swapping an edge) need Memo.invalidate(G)
+    or a bump of G.graph['version']. Attributes changed in place always need one of them.
+    '''
+    return (G.number_of_nodes(), G.number_of_edges(), G.graph.get('version', 0))
+
+### MUTATION TRACKING ###
+# networkx methods that change the nodes or the edges of a graph
+MUTATORS = ('add_node', 'add_nodes_from', 'remove_node', 'remove_nodes_from', 'add_edge', 'add_edges_from',
+            'add_weighted_edges_from', 'remove_edge', 'remove_edges_from', 'update', 'clear', 'clear_edges')
+
+def _bumping(name):
+    def method(self, *args, **kwargs):
+        version = self.graph.get('version', 0)
+        result = getattr(super(VersionedGraphMixin, self), name)(*args, **kwargs)
+        # after the call: clear() empties G.graph
+        self.graph['version'] = version + 1
+        return result
+    method.__name__ = name
+    return method
+
+class VersionedGraphMixin:
+    '''
+    Bumps G.graph['version'] at every call of a networkx mutator (MUTATORS), so that graph_state
+    changes with every structural edit
+    '''
+    pass
+
+for _name in MUTATORS:
+    setattr(VersionedGraphMixin, _name, _bumping(_name))
+
+class VersionedGraph(VersionedGraphMixin, nx.Graph):
+    pass
+
+class VersionedDiGraph(VersionedGraphMixin, nx.DiGraph):
+    pass
+
+def track_mutations(G):
+    '''
+    Switches a nx.Graph or nx.DiGraph to its versioned subclass, in place (nothing is copied)
+
+    output
+    G: the same graph
+    '''
+    if not isinstance(G, VersionedGraphMixin):
+        G.__class__ = VersionedDiGraph if G.is_directed() else VersionedGraph
+    return G
+
+### ARGUMENT NORMALISATION ###
+# Position of N among the arguments following G
+N_POSITION = {'funct_3': 3, 'funct_4': 2, 'funct_5': 2}
+
+class ObjectKey(tuple):
+    '''
+    Key of an argument that is not a plain value (e.g. an index built on the graph): the object
+    is identified by its id and is never pickled, since it may hold the whole graph
+    '''
+    pass
+
+def _scalar(x):
+    '''
+    NumPy scalars (e.g. np.int64(10)) are turned into the equal Python values
+    '''
+    if isinstance(x, (numbers.Number, np.generic)) and hasattr(x, 'item'):
+        return x.item()
+    return x
+
+def _is_value(x):
+    return x is None or isinstance(x, (str, numbers.Number))
+
+def _freeze(x):
+    '''
+    Turns lists and sets into tuples and NumPy scalars into Python values,
+    so that equal arguments give equal keys
+    '''
+    if isinstance(x, (list, tuple)):
+        return tuple(_freeze(v) for v in x)
+    if isinstance(x, (set, frozenset)):
+        return tuple(sorted(_freeze(v) for v in x))
+    x = _scalar(x)
+    if _is_value(x):
+        return x
+    return ObjectKey((type(x).__name__, id(x)))
+
+def _objects(args):
+    '''
+    Arguments that are keyed by identity, looked up in the original (not normalised) arguments
+    '''
+    found = []
+    for x in args:
+        if isinstance(x, (list, tuple, set, frozenset)):
+            found.extend(_objects(x))
+        elif not _is_value(_scalar(x)):
+            found.append(x)
+    return found
+
+def _has_objects(args):
+    return any(isinstance(x, ObjectKey) or (isinstance(x, tuple) and _has_objects(x)) for x in args)
+
+def normalise_arguments(name, G, args):
+    '''
+    input
+    name: name of the backend function
+    G: the graph data
+    args: arguments following G
+
+    output
+    tuple of the arguments in canonical form. The top N selection of funct_3, funct_4 and
+    funct_5 gives the whole graph for every N >= |V(G)|, so N is clipped to |V(G)|.
+    '''
+    args = list(_freeze(args))
+    if name == 'top_k_central' and args and isinstance(args[0], int):
+        args[0] = min(args[0], G.number_of_nodes())
+    if name in N_POSITION and len(args) > N_POSITION[name] and isinstance(args[N_POSITION[name]], int):
+        args[N_POSITION[name]] = min(args[N_POSITION[name]], G.number_of_nodes())
+    if name == 'funct_5':
+        # the number of workers does not change the result
+        args = args[:3]
+    if name in ('funct_1', 'funct_2', 'top_k_central') and args and isinstance(args[-1], str):
+        args[-1] = args[-1].lower()
+    return tuple(args)
+
+def _contains_id(args, object_id):
+    return any((isinstance(x, ObjectKey) and x[1] == object_id) or
+               (isinstance(x, tuple) and not isinstance(x, ObjectKey) and _contains_id(x, object_id)) for x in args)
+
+### MEMOISATION LAYER ###
+class Memo:
+    '''
+    Memoisation of the backend queries, keyed on (graph fingerprint, function, normalised arguments).
+    The in-memory tier is an LRU of bounded size, the optional on-disk tier keeps every result
+    as a pickle file. When a graph already seen is mutated, the entries computed on its previous
+    state are dropped from both tiers.
+
+    The fingerprint of a graph is computed once and reused while graph_state(G) is unchanged,
+    so a cache hit costs O(1) in the size of the graph. Structural edits are seen automatically
+    on a graph passed to track_mutations (the memo tracks every graph it is given unless
+    track = False); attributes changed in place need invalidate(G). With verify = True the
+    fingerprint is recomputed on every call (O(|V| + |E|)) instead, which sees any edit.
+    Arguments that are objects (e.g. an index built on the graph) are keyed by identity: their results
+    stay in memory only and are dropped with the object; objects that cannot be weakly referenced
+    are not cached at all. Keyword arguments and defaults are bound to the signature of the function,
+    so f(G, a) and f(G, a, None) share one entry.
+
+    input
+    maxsize: maximum number of results kept in memory
+    directory: directory of the on-disk tier, None to disable it
+    verify: recompute the fingerprint of the graph on every call
+    track: call track_mutations on the graphs passed to the memo
+
+    Example:
+    memo = Memo(maxsize = 256, directory = 'cache')
+    funct_5 = memo.wrap(backend.funct_5)
+    funct_5(G, paper_1, paper_2, N)
+    memo.stats()
+    '''
+    def __init__(self, maxsize = 128, directory = None, verify = False, track = True):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.verify = verify
+        self.track = track
+        self.signatures = {}
+        self.entries = collections.OrderedDict()
+        # graph -> (state, fingerprint) of the last hash, to detect mutations
+        self.fingerprints = weakref.WeakKeyDictionary()
+        # ids of the objects used as arguments whose deletion is watched
+        self.watched = set()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok = True)
+
+    def _fingerprint(self, G):
+        if self.track and type(G) in (nx.Graph, nx.DiGraph):
+            track_mutations(G)
+        state = graph_state(G)
+        previous = self.fingerprints.get(G)
+        if not self.verify and previous is not None and previous[0] == state:
+            return previous[1]
+        fingerprint = graph_fingerprint(G)
+        if previous is not None and previous[1] != fingerprint:
+            self.invalidate(previous[1])
+        self.fingerprints[G] = (state, fingerprint)
+        return fingerprint
+
+    def _watch(self, x):
+        '''
+        Drops the entries keyed by an object when it is deleted, before its id can be reused.
+        Returns False if the object cannot be weakly referenced (its results are not cached)
+        '''
+        if id(x) not in self.watched:
+            try:
+                weakref.finalize(x, self._forget, id(x))
+            except TypeError:
+                return False
+            self.watched.add(id(x))
+        return True
+
+    def _forget(self, object_id):
+        self.watched.discard(object_id)
+        for key in [k for k in self.entries if _contains_id(k[2], object_id)]:
+            del self.entries[key]
+
+    def _path(self, key):
+        digest = hashlib.blake2b(pickle.dumps(key[1:]), digest_size = 16).hexdigest()
+        return os.path.join(self.directory, key[0], digest + '.pkl')
+
+    def invalidate(self, target):
+        '''
+        Drops every entry computed on a graph
+
+        input
+        target: the graph (to call after editing it in place) or its fingerprint
+        '''
+        if not isinstance(target, str):
+            previous = self.fingerprints.pop(target, None)
+            if previous is None:
+                return
+            fingerprint = previous[1]
+        else:
+            fingerprint = target
+        for key in [k for k in self.entries if k[0] == fingerprint]:
+            del self.entries[key]
+            self.invalidations += 1
+        if self.directory is not None:
+            shutil.rmtree(os.path.join(self.directory, fingerprint), ignore_errors = True)
+
+    def _bind(self, func, G, args, kwargs):
+        '''
+        Arguments following G, positional and in the order of the signature, with the defaults filled in
+        '''
+        if func not in self.signatures:
+            self.signatures[func] = inspect.signature(func)
+        bound = self.signatures[func].bind(G, *args, **kwargs)
+        bound.apply_defaults()
+        return tuple(bound.arguments.values())[1:]
+
+    def call(self, func, G, *args, **kwargs):
+        '''
+        Returns func(G, *args, **kwargs), computing it only if it is not cached yet
+        '''
+        name = func.__name__
+        bound = self._bind(func, G, args, kwargs)
+        if not all([self._watch(x) for x in _objects(bound)]):
+            self.misses += 1
+            return func(G, *args, **kwargs)
+        key = (self._fingerprint(G), name, normalise_arguments(name, G, bound))
+        # results depending on objects are kept in memory only
+        disk = self.directory is not None and not _has_objects(key[2])
+
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return copy.deepcopy(self.entries[key])
+
+        if disk:
+            path = self._path(key)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    result = pickle.load(f)
+                self.disk_hits += 1
+                self._store(key, result)
+                return copy.deepcopy(result)
+
+        self.misses += 1
+        result = func(G, *args, **kwargs)
+        self._store(key, copy.deepcopy(result))
+        if disk:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            # write then rename, so that a concurrent reader never sees a partial file
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(result, f)
+            os.replace(path + '.tmp', path)
+        return result
+
+    def _store(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
+            self.evictions += 1
+
+    def wrap(self, func):
+        '''
+        Returns a memoised version of a backend function whose first argument is the graph
+        '''
+        @functools.wraps(func)
+        def wrapper(G, *args, **kwargs):
+            return self.call(func, G, *args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        '''
+        output
+        dictionary with hits (memory and disk), misses, evictions, invalidations and current size
+        '''
+        requests = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits)/requests if requests else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+        }
+
+    def clear(self):
+        '''
+        Empties both tiers and resets the statistics
+        '''
+        self.entries.clear()
+        self.fingerprints = weakref.WeakKeyDictionary()
+        self.hits = self.disk_hits = self.misses = self.evictions = self.invalidations = 0
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors = True)
+            os.makedirs(self.directory, exist_ok = True)
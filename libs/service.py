@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import socket
+import urllib.error
+import urllib.request
+import networkx as nx
+from . import backend
+from .topk import top_k_central
+from .graphformat import intern_attributes
+
+# Default paths of the graphs, relative to the repository root
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+GRAPH_PATHS = {
+    'citation': os.path.join(ROOT, 'citation_graph.graphml'),
+    'collaboration': os.path.join(ROOT, 'collaboration_graph.graphml'),
+}
+
+# Seconds the client waits for an answer beyond the timeout of its request
+# (the transfer of the result), and without a request timeout
+SOCKET_SLACK = 30
+SOCKET_TIMEOUT = 330
+
+# Graphs loaded in the current process (the server and, once, every worker)
+_GRAPHS = {}
+
+### GRAPH LOADING ###
+def load_graphs(paths, intern = False):
+    '''
+    Loads the graphs that are not loaded yet in the current process
+
+    input
+    paths: dictionary {graph name: path of the .graphml file}, missing files are skipped
+    intern: if True, the equal string attributes share one object (graphformat.intern_attributes)
+    '''
+    for name, path in paths.items():
+        if name not in _GRAPHS and path and os.path.exists(path):
+            G = nx.read_graphml(path)
+            if intern:
+                intern_attributes(G)
+            _GRAPHS[name] = G
+
+def _init_worker(paths, intern):
+    # With the 'fork' start method the graphs loaded by the server are inherited
+    # and nothing is read again; otherwise every worker loads them once here
+    load_graphs(paths, intern)
+
+### QUERIES (run inside the worker processes) ###
+def _jsonable(x):
+    '''
+    Converts the outputs of the backend (tuples, sets, numpy scalars) into JSON-friendly objects
+    '''
+    if isinstance(x, dict):
+        return {str(k): _jsonable(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple, set, frozenset)):
+        return [_jsonable(v) for v in x]
+    if hasattr(x, 'item'):
+        return x.item()
+    return x
+
+def graph_data(G_sub):
+    '''
+    output
+    data: dictionary describing the graph G_sub, readable by graph_from_data
+    '''
+    return {
+        'directed': G_sub.is_directed(),
+        'nodes': [[n, d] for n, d in G_sub.nodes(data = True)],
+        'edges': [[u, v, d] for u, v, d in G_sub.edges(data = True)],
+    }
+
+def neighbourhood(G, N, seeds, k, cap):
+    '''
+    input
+    G: the graph data
+    N: numerosity of top nodes by degree to consider
+    seeds, k, cap: arguments of backend.k_hop_subgraph
+
+    output
+    data: dictionary describing the k-hop neighbourhood of the seeds inside the top N subgraph
+    '''
+    return graph_data(backend.k_hop_subgraph(backend.top_n_subgraph(G, N), seeds, k, cap))
+
+def graph_from_data(data):
+    '''
+    Inverse of graph_data: builds a networkx graph from its dictionary description
+    '''
+    G = nx.DiGraph() if data['directed'] else nx.Graph()
+    G.add_nodes_from((n, d) for n, d in data['nodes'])
+    G.add_edges_from((u, v, d) for u, v, d in data['edges'])
+    return G
+
+# Queries exposed by the service: name -> function(G, *args)
+QUERIES = {
+    'id_finder': backend.id_finder,
+    'funct_1': backend.funct_1,
+    'funct_2': backend.funct_2,
+    'funct_3': backend.funct_3,
+    'funct_4': backend.funct_4,
+    'funct_5': backend.funct_5,
+    'top_k_central': top_k_central,
+    'neighbourhood': neighbourhood,
+}
+
+def run_query(graph, query, args):
+    '''
+    Runs one query on one of the graphs loaded in the current process
+
+    input
+    graph: graph name, 'citation' or 'collaboration'
+    query: one of the keys of QUERIES
+    args: list of the arguments following G
+
+    output
+    the JSON-friendly output of the query
+    '''
+    G = _GRAPHS[graph]
+    # the service is already a process pool: funct_5 processes its components serially
+    if query == 'funct_5' and len(args) == 3:
+        args = list(args) + [1]
+    result = QUERIES[query](G, *args)
+    # the clients of funct_1 only count the nodes and the edges, so the lists are not sent
+    if query == 'funct_1':
+        result = (len(result[0]), len(result[1])) + tuple(result[2:])
+    return _jsonable(result)
+
+### SERVICE ###
+class QueryError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class QueryService:
+    '''
+    Local HTTP/JSON service answering backend queries on graphs loaded once.
+    The CPU-bound work runs in a process pool, identical requests in flight share
+    the same computation and every request can set its own timeout.
+
+    Requests are 'POST /<query>' with a JSON body {"graph": ..., "args": [...], "timeout": seconds};
+    the answer is {"result": ...} or {"error": ...}. 'GET /graphs' lists the loaded graphs.
+
+    A timeout only ends the wait of the request (504): the computation is not cancelled and keeps
+    its worker until it finishes, as a running task of a process pool cannot be stopped and the
+    worker is not recycled. A few timed-out funct_2/funct_5 calls can therefore hold every worker
+    and make the later requests queue behind them; an identical request sent again joins the
+    computation still running instead of starting a new one.
+
+    input
+    paths: dictionary {graph name: path of the .graphml file}
+    workers: number of worker processes
+    timeout: default timeout of a request in seconds (None means no timeout)
+    intern: if True, the equal string attributes of the graphs share one object
+    '''
+    def __init__(self, paths = GRAPH_PATHS, workers = None, timeout = 300, intern = False):
+        self.paths = dict(paths)
+        self.intern = intern
+        self.workers = workers
+        self.timeout = timeout
+        self.pool = None
+        self.server = None
+        # key of the request -> future of the running computation
+        self.inflight = {}
+
+    def start_pool(self):
+        load_graphs(self.paths, self.intern)
+        if not _GRAPHS:
+            raise FileNotFoundError('No graph could be loaded from ' + str(self.paths))
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers = self.workers, initializer = _init_worker, initargs = (self.paths, self.intern))
+
+    def graphs(self):
+        return {name: {'directed': G.is_directed(), 'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+                for name, G in _GRAPHS.items()}
+
+    async def query(self, graph, query, args, timeout = None):
+        '''
+        Runs a query in the process pool, sharing the computation with identical requests in flight.
+        On timeout the computation keeps running in its worker (see the class docstring).
+        '''
+        if graph not in _GRAPHS:
+            raise QueryError(404, f'Unknown graph {graph}')
+        if query not in QUERIES:
+            raise QueryError(404, f'Unknown query {query}')
+        key = json.dumps([graph, query, args])
+        future = self.inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.pool, run_query, graph, query, args)
+            self.inflight[key] = future
+            future.add_done_callback(lambda f: self.inflight.pop(key, None))
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            # shield: a request that times out must not cancel the one it is coalesced with
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise QueryError(504, f'Query {query} timed out after {timeout} seconds')
+
+    async def handle(self, reader, writer):
+        status, payload = 200, None
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            if len(request_line) < 2:
+                raise QueryError(400, 'Malformed request')
+            method, path = request_line[0], request_line[1].strip('/')
+            if method == 'GET' and path == 'graphs':
+                payload = {'result': self.graphs()}
+            elif method == 'POST':
+                try:
+                    request = json.loads(body or b'{}')
+                except ValueError:
+                    raise QueryError(400, 'The body is not valid JSON')
+                result = await self.query(request.get('graph'), path, request.get('args', []), request.get('timeout'))
+                payload = {'result': result}
+            else:
+                raise QueryError(404, f'Unknown endpoint {method} /{path}')
+        except QueryError as e:
+            status, payload = e.status, {'error': str(e)}
+        except Exception as e:
+            status, payload = 500, {'error': f'{type(e).__name__}: {e}'}
+
+        data = json.dumps(payload).encode()
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+        writer.write(f'HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host = '127.0.0.1', port = 8765):
+        if self.pool is None:
+            self.start_pool()
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    async def serve_forever(self, host = '127.0.0.1', port = 8765):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures = True)
+
+### THIN CLIENT ###
+class ServiceClient:
+    '''
+    Client of a running QueryService
+
+    input
+    url: address of the service
+    timeout: default timeout of the requests in seconds, enforced by the service
+    socket_timeout: seconds the client waits for the service when a request has no timeout;
+                    with a timeout it waits SOCKET_SLACK seconds more than the timeout.
+                    A TimeoutError is raised when the wait expires
+    '''
+    def __init__(self, url = 'http://127.0.0.1:8765', timeout = None, socket_timeout = SOCKET_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.socket_timeout = socket_timeout
+
+    def _request(self, path, body = None, timeout = None):
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(self.url + '/' + path, data = data, headers = {'Content-Type': 'application/json'})
+        wait = self.socket_timeout if timeout is None else timeout + SOCKET_SLACK
+        try:
+            with urllib.request.urlopen(request, timeout = wait) as response:
+                return json.loads(response.read())['result']
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read()).get('error', str(e))) from None
+        except (socket.timeout, urllib.error.URLError) as e:
+            if isinstance(e, socket.timeout) or isinstance(e.reason, socket.timeout):
+                raise TimeoutError(f'No answer from {self.url} after {wait} seconds') from None
+            raise
+
+    def graphs(self):
+        return self._request('graphs')
+
+    def call(self, graph, query, *args, timeout = None):
+        timeout = self.timeout if timeout is None else timeout
+        return self._request(query, {'graph': graph, 'args': list(args), 'timeout': timeout}, timeout)
+
+    def graph(self, name):
+        '''
+        Returns a RemoteGraph that the frontend visualizations accept in place of a networkx graph
+        '''
+        return RemoteGraph(self, name, self.graphs()[name]['directed'])
+
+class RemoteGraph:
+    '''
+    Handle of a graph loaded by the service. The frontend functions accept it in place of G:
+    the backend functionalities then run on the service, and only the part of the top N subgraph
+    needed for the drawings is transferred.
+    '''
+    def __init__(self, client, name, directed):
+        self.client = client
+        self.name = name
+        self.directed = directed
+
+    def is_directed(self):
+        return self.directed
+
+    def call(self, query, *args):
+        return self.client.call(self.name, query, *args)
+
+    def neighbourhood(self, N, seeds, k, cap):
+        return graph_from_data(self.call('neighbourhood', N, list(seeds), k, cap))
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Serve backend queries over HTTP/JSON.')
+    parser.add_argument('--citation', default = GRAPH_PATHS['citation'], help = 'path of the citation graph')
+    parser.add_argument('--collaboration', default = GRAPH_PATHS['collaboration'], help = 'path of the collaboration graph')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8765)
+    parser.add_argument('--workers', type = int, default = None, help = 'number of worker processes')
+    parser.add_argument('--timeout', type = float, default = 300, help = 'default timeout of a request in seconds')
+    parser.add_argument('--intern', action = 'store_true', help = 'share one object between the equal string attributes')
+    args = parser.parse_args(argv)
+
+    service = QueryService({'citation': args.citation, 'collaboration': args.collaboration}, workers = args.workers,
+                           timeout = args.timeout, intern = args.intern)
+    service.start_pool()
+    print(f'Serving {", ".join(_GRAPHS)} on http://{args.host}:{args.port}', flush = True)
+    try:
+        asyncio.run(service.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+if __name__ == '__main__':
+    main()
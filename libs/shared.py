@@ -0,0 +1,339 @@
+import os
+import uuid
+import json
+import numpy as np
+import networkx as nx
+from multiprocessing import shared_memory
+from .graphformat import NODE_LABELS, EDGE_WEIGHT, EDGE_LABEL, encode_strings, decode_string, adjacency_csr, sort_rows
+
+# Arrays start on 64-byte boundaries inside the shared block
+ALIGNMENT = 64
+
+### GRAPH ARRAYS ###
+def graph_arrays(G, weight = EDGE_WEIGHT):
+    '''
+    Flat numpy arrays describing G, built straight from the networkx dictionaries
+    (with np.fromiter, no intermediate Python list of edges)
+
+    input
+    G: the graph data
+    weight: name of the edge attribute used as weight (missing values count as 1)
+
+    output
+    arrays: dictionary of arrays
+            indptr, indices          CSR of the (outgoing) neighbours, undirected edges in both directions,
+                                     the neighbours of every row sorted by index
+            in_indptr, in_indices    CSR of the incoming neighbours (directed graphs only), sorted likewise
+            degree                   degree of every node, as G.degree()
+            weights                  weight of every entry of indices
+            node_labels, edge_labels handles into the label pool (-1 if missing)
+            ids_*, pool_*            offsets and utf-8 blob of the node ids and of the label pool
+    meta: dictionary with directed, number of nodes and edges, name of the node label
+    '''
+    directed = G.is_directed()
+    nodes = G.nodes()
+    n = G.number_of_nodes()
+    row = {node: i for i, node in enumerate(nodes)}
+    succ = G.succ if directed else G.adj
+    # one index type for indptr and indices, so that SciPy can use them without a cast
+    entries = sum(len(nbrs) for nbrs in succ.values())
+    index_dtype = np.int32 if max(n, entries) < 2**31 else np.int64
+
+    arrays = {}
+    arrays['indptr'], indices = adjacency_csr(succ, row, index_dtype)
+    # sorted rows, so that the read-only matrix of to_scipy is already in canonical form
+    arrays['indices'], order = sort_rows(arrays['indptr'], indices)
+    if directed:
+        arrays['in_indptr'], in_indices = adjacency_csr(G.pred, row, index_dtype)
+        arrays['in_indices'] = sort_rows(arrays['in_indptr'], in_indices)[0]
+        arrays['degree'] = (np.diff(arrays['indptr']) + np.diff(arrays['in_indptr'])).astype(index_dtype)
+    else:
+        # a self-loop counts twice in the degree of networkx
+        loops = np.fromiter((u in nbrs for u, nbrs in succ.items()), dtype = index_dtype, count = n)
+        arrays['degree'] = np.diff(arrays['indptr']) + loops
+    arrays['weights'] = np.fromiter((d.get(weight, 1) for nbrs in succ.values() for d in nbrs.values()),
+                                    dtype = np.float64, count = entries)[order]
+
+    # node and edge labels share one pool of distinct strings
+    pool = {}
+    intern = lambda s: -1 if s is None else pool.setdefault(s, len(pool))
+    node_label = next((key for key in NODE_LABELS if any(G.nodes[v].get(key) is not None for v in nodes)), None)
+    if node_label is not None:
+        arrays['node_labels'] = np.fromiter((intern(G.nodes[v].get(node_label)) for v in nodes), dtype = np.int32, count = n)
+    edge_labels = np.fromiter((intern(d.get(EDGE_LABEL)) for nbrs in succ.values() for d in nbrs.values()),
+                              dtype = np.int32, count = entries)[order]
+    if (edge_labels >= 0).any():
+        arrays['edge_labels'] = edge_labels
+
+    arrays['ids_offsets'], arrays['ids_blob'] = encode_strings((str(v) for v in nodes), n)
+    arrays['pool_offsets'], arrays['pool_blob'] = encode_strings(pool, len(pool))
+    meta = {'directed': directed, 'nodes': n, 'edges': G.number_of_edges(), 'node_label': node_label, 'sorted': True}
+    return arrays, meta
+
+### SHARED GRAPH ###
+def _layout(arrays):
+    '''
+    Position of every array inside one block: {name: (offset, dtype, shape)} and the total size
+    '''
+    layout, size = {}, 0
+    for name, a in arrays.items():
+        size = -(-size // ALIGNMENT) * ALIGNMENT
+        layout[name] = (size, a.dtype.str, list(a.shape))
+        size += a.nbytes
+    return layout, max(size, 1)
+
+class SharedGraph:
+    '''
+    Read-only graph published once in shared memory (or in a memory-mapped file) and attached
+    zero-copy by any number of processes: the adjacency, degree and attribute arrays are numpy
+    views on the same physical pages, so a worker pays neither the pickling of a networkx graph
+    nor a copy of it. Nodes are integer positions; ids and labels are decoded on demand.
+
+    The spec is a small JSON-friendly dictionary: pass it to the workers (as an argument or through
+    the initializer of the pool) and call attached(spec) there. The publisher owns the memory and
+    must call unlink() when the workers are done (a file-backed graph can instead be kept and
+    reattached later). Views obtained from the graph must be dropped before close().
+
+    Example:
+    with SharedGraph.publish(G) as shared:
+        with concurrent.futures.ProcessPoolExecutor() as pool:
+            degrees = list(pool.map(work, [shared.spec]*4))
+
+    def work(spec):
+        shared = attached(spec)
+        return shared.degree.max()
+    '''
+    def __init__(self, spec, buffer, shm = None, owner = False):
+        self.spec = spec
+        self.meta = spec['meta']
+        self.directed = self.meta['directed']
+        self._shm = shm
+        self._owner = owner
+        self._index = None
+        self.arrays = {name: np.ndarray(tuple(shape), dtype = np.dtype(dtype), buffer = buffer, offset = offset)
+                       for name, (offset, dtype, shape) in spec['layout'].items()}
+        for a in self.arrays.values():
+            a.flags.writeable = False
+        for name in ('indptr', 'indices', 'in_indptr', 'in_indices', 'degree', 'weights', 'node_labels', 'edge_labels'):
+            setattr(self, name, self.arrays.get(name))
+
+    ### PUBLISHING AND ATTACHING ###
+    @classmethod
+    def publish(cls, G, directory = None, weight = EDGE_WEIGHT):
+        '''
+        input
+        G: the graph data
+        directory: if given, the arrays are written to directory/graph.bin and memory-mapped
+                   instead of being placed in shared memory
+        weight: name of the edge attribute used as weight
+
+        output
+        the SharedGraph owning the memory
+        '''
+        arrays, meta = graph_arrays(G, weight)
+        layout, size = _layout(arrays)
+        spec = {'meta': meta, 'layout': layout, 'size': size}
+        if directory is None:
+            shm = shared_memory.SharedMemory(name = 'graph_' + uuid.uuid4().hex[:16], create = True, size = size)
+            buffer = shm.buf
+            spec['shm'] = shm.name
+        else:
+            os.makedirs(directory, exist_ok = True)
+            spec['path'] = os.path.join(os.path.abspath(directory), 'graph.bin')
+            buffer = np.memmap(spec['path'], dtype = np.uint8, mode = 'w+', shape = (size,))
+            shm = None
+        for name, a in arrays.items():
+            offset = layout[name][0]
+            np.frombuffer(buffer, dtype = np.uint8, count = a.nbytes, offset = offset)[:] = a.view(np.uint8).reshape(-1)
+        if directory is not None:
+            buffer.flush()
+            with open(os.path.join(directory, 'spec.json'), 'w') as f:
+                json.dump(spec, f)
+            del buffer
+            return cls.attach(spec, owner = True)
+        return cls(spec, buffer, shm, owner = True)
+
+    @classmethod
+    def attach(cls, spec, owner = False):
+        '''
+        Attaches to a graph published by another process, without copying it
+
+        input
+        spec: the spec of the published graph, or the directory of a file-backed one
+        '''
+        if isinstance(spec, str):
+            with open(os.path.join(spec, 'spec.json')) as f:
+                spec = json.load(f)
+        if 'shm' in spec:
+            try:
+                # Python >= 3.13: the attaching process must not unlink the block at exit
+                shm = shared_memory.SharedMemory(name = spec['shm'], track = False)
+            except TypeError:
+                shm = shared_memory.SharedMemory(name = spec['shm'])
+            return cls(spec, shm.buf, shm, owner)
+        buffer = np.memmap(spec['path'], dtype = np.uint8, mode = 'r', shape = (spec['size'],))
+        return cls(spec, buffer, None, owner)
+
+    def close(self):
+        '''
+        Detaches the current process from the graph
+        '''
+        self.arrays = {}
+        for name in ('indptr', 'indices', 'in_indptr', 'in_indices', 'degree', 'weights', 'node_labels', 'edge_labels'):
+            setattr(self, name, None)
+        if self._shm is not None:
+            self._shm.close()
+
+    def unlink(self):
+        '''
+        Closes the graph and frees the memory (or deletes the file); only the publisher should call it
+        '''
+        self.close()
+        if not self._owner:
+            return
+        if self._shm is not None:
+            self._shm.unlink()
+        else:
+            for path in (self.spec['path'], os.path.join(os.path.dirname(self.spec['path']), 'spec.json')):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._owner = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._owner:
+            self.unlink()
+        else:
+            self.close()
+
+    ### QUERIES ###
+    def number_of_nodes(self):
+        return self.meta['nodes']
+
+    def number_of_edges(self):
+        return self.meta['edges']
+
+    def node_id(self, i):
+        return decode_string(self.arrays['ids_offsets'], self.arrays['ids_blob'], i)
+
+    def index(self, node):
+        '''
+        Position of a node id, -1 if it is not in the graph (the table is built on the first call)
+        '''
+        if self._index is None:
+            self._index = {self.node_id(i): i for i in range(self.number_of_nodes())}
+        return self._index.get(str(node), -1)
+
+    def _label(self, handle):
+        return None if handle < 0 else decode_string(self.arrays['pool_offsets'], self.arrays['pool_blob'], handle)
+
+    def node_label(self, i):
+        return None if self.node_labels is None else self._label(self.node_labels[i])
+
+    def neighbors(self, i):
+        '''
+        Positions of the (outgoing) neighbours of node i, as a view
+        '''
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def predecessors(self, i):
+        if not self.directed:
+            return self.neighbors(i)
+        return self.in_indices[self.in_indptr[i]:self.in_indptr[i+1]]
+
+    def edge_label(self, i, j):
+        '''
+        Label of the edge i -> j, None if the edge or the label is missing
+        '''
+        start = self.indptr[i]
+        positions = np.flatnonzero(self.neighbors(i) == j)
+        if self.edge_labels is None or not len(positions):
+            return None
+        return self._label(self.edge_labels[start + positions[0]])
+
+    def to_networkx(self, nodes = None):
+        '''
+        input
+        nodes: positions of the nodes to keep (None means all of them)
+
+        output
+        G: networkx graph induced by the nodes, with the original ids, labels, weights and edge labels
+        '''
+        keep = np.arange(self.number_of_nodes()) if nodes is None else np.asarray(nodes, dtype = np.int64)
+        mask = np.zeros(self.number_of_nodes(), dtype = bool)
+        mask[keep] = True
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        label = self.meta['node_label']
+        for i in keep:
+            G.add_node(self.node_id(i), **({label: self.node_label(i)} if label and self.node_labels[i] >= 0 else {}))
+        for i in keep:
+            u = self.node_id(i)
+            for k in range(self.indptr[i], self.indptr[i+1]):
+                j = self.indices[k]
+                if mask[j]:
+                    data = {EDGE_WEIGHT: float(self.weights[k])}
+                    if self.edge_labels is not None and self.edge_labels[k] >= 0:
+                        data[EDGE_LABEL] = self._label(self.edge_labels[k])
+                    G.add_edge(u, self.node_id(j), **data)
+        return G
+
+    def to_scipy(self, weighted = True):
+        '''
+        output
+        A: scipy.sparse CSR adjacency matrix whose index arrays are the shared ones (no copy);
+           the weights if weighted, ones otherwise. The rows are sorted and free of duplicates, and
+           the matrix is flagged so (sort_indices and sum_duplicates do nothing), but the arrays are
+           read-only: call A.copy() before any method that edits the matrix in place, such as
+           eliminate_zeros or item assignment
+        '''
+        A = _csr_matrix(self.weights if weighted else np.ones(len(self.indices)), self.indices, self.indptr, self.number_of_nodes())
+        # graphs published before the rows were sorted are left unflagged
+        if self.meta.get('sorted'):
+            A.has_canonical_format = True
+        return A
+
+### WORKER SIDE ###
+# Graphs attached in the current process, by shared block or file
+_ATTACHED = {}
+
+def attached(spec):
+    '''
+    Returns the SharedGraph of a spec, attaching to it only the first time in the current process
+    '''
+    key = spec if isinstance(spec, str) else spec.get('shm', spec.get('path'))
+    if key not in _ATTACHED:
+        _ATTACHED[key] = SharedGraph.attach(spec)
+    return _ATTACHED[key]
+
+### SCIPY EXPORT ###
+def _csr_matrix(data, indices, indptr, n):
+    # SciPy is only needed by this export
+    import scipy.sparse
+    matrix = getattr(scipy.sparse, 'csr_array', scipy.sparse.csr_matrix)
+    return matrix((data, indices, indptr), shape = (n, n), copy = False)
+
+def to_scipy_sparse(G, weight = EDGE_WEIGHT):
+    '''
+    input
+    G: the graph data, or a SharedGraph
+    weight: name of the edge attribute used as weight, None for an unweighted matrix
+
+    output
+    A: scipy.sparse CSR adjacency matrix, rows and columns in the order of G.nodes()
+       (undirected edges in both directions), built from numpy arrays without Python lists
+    '''
+    if isinstance(G, SharedGraph):
+        return G.to_scipy(weight is not None)
+    directed = G.is_directed()
+    succ = G.succ if directed else G.adj
+    row = {node: i for i, node in enumerate(G)}
+    n = len(row)
+    entries = sum(len(nbrs) for nbrs in succ.values())
+    indptr, indices = adjacency_csr(succ, row, np.int32 if max(n, entries) < 2**31 else np.int64)
+    if weight is None:
+        data = np.ones(entries)
+    else:
+        data = np.fromiter((d.get(weight, 1) for nbrs in succ.values() for d in nbrs.values()), dtype = np.float64, count = entries)
+    return _csr_matrix(data, indices, indptr, n)
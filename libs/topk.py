@@ -0,0 +1,402 @@
+import heapq
+import itertools
+import math
+import random
+from collections import deque
+import numpy as np
+import networkx as nx
+from .tracing import traced, stage, count
+
+### HELPERS ###
+def _ranking(scores, errors, k):
+    '''
+    input
+    scores: dictionary {node: score}
+    errors: dictionary {node: error bound}
+    k: number of nodes to return
+
+    output
+    nodes, scores, errors: lists of the top k nodes by score, in decreasing order (ties by node order)
+    '''
+    order = {node: i for i, node in enumerate(scores)}
+    top = heapq.nsmallest(k, scores, key = lambda node: (-scores[node], order[node]))
+    return top, [scores[node] for node in top], [errors[node] for node in top]
+
+### TOP-K CLOSENESS ###
+def _closeness_upper_bound(c, S, d, reach, n):
+    '''
+    Upper bound of the closeness (Wasserman and Faust formula) of a node whose search has found
+    c nodes (itself included) at total distance S, when every other node is at distance >= d
+    and at most reach nodes (itself included) can be found in total.
+    The closeness as a function of the number r of nodes found is convex, so the maximum over
+    c <= r <= reach is at one of the two ends.
+    '''
+    best = 0.0
+    for r in (c, reach):
+        denominator = (n - 1)*(S + (r - c)*d)
+        if r > 1:
+            best = max(best, (r - 1)**2/denominator if denominator > 0 else float('inf'))
+    return best
+
+def _reach_upper_bounds(G, max_bytes = 2**24):
+    '''
+    For every node, an upper bound of the number of nodes (itself included) at finite distance
+    towards it. In an undirected graph it is the size of its component. In a directed graph the
+    strongly connected components that reach it are collected as bitsets over the condensation,
+    which gives the exact number; a bitset is freed once all its successors have used it, and if
+    the bitsets alive exceed max_bytes the sizes are summed instead (overcounting components
+    reached through different paths), capped by the size of the weakly connected component.
+    '''
+    if not G.is_directed():
+        return {node: len(c) for c in nx.connected_components(G) for node in c}
+    C = nx.condensation(G)
+    size = {c: len(C.nodes[c]['members']) for c in C}
+    order = list(nx.topological_sort(C))
+    bound = _exact_reach(C, order, size, max_bytes)
+    if bound is None:
+        weak = {node: len(c) for c in nx.weakly_connected_components(G) for node in c}
+        bound = {}
+        for c in order:
+            bound[c] = size[c] + sum(bound[p] for p in C.pred[c])
+        return {node: min(bound[c], weak[node]) for node, c in C.graph['mapping'].items()}
+    return {node: bound[c] for node, c in C.graph['mapping'].items()}
+
+def _exact_reach(C, order, size, max_bytes):
+    '''
+    Number of nodes reaching every component of the condensation C, None if the bitsets
+    alive at the same time would take more than max_bytes
+    '''
+    # component c owns size[c] consecutive bits, so the popcount of a bitset is a number of nodes
+    ancestors = {}
+    waiting = {c: len(C.succ[c]) for c in C}
+    bound = {}
+    offset = live = 0
+    for c in order:
+        bits = ((1 << size[c]) - 1) << offset
+        offset += size[c]
+        for p in C.pred[c]:
+            bits |= ancestors[p]
+            waiting[p] -= 1
+            if not waiting[p]:
+                live -= ancestors.pop(p).bit_length()//8
+        bound[c] = bits.bit_count()
+        if waiting[c]:
+            ancestors[c] = bits
+            live += bits.bit_length()//8
+            if live > max_bytes:
+                return None
+    return bound
+
+def _bounded_closeness(adj, v, n, reach, threshold, weight):
+    '''
+    Closeness of v from a BFS (Dijkstra if weight is given) on adj, stopped as soon as its upper
+    bound cannot exceed threshold
+
+    output
+    closeness of v, or None if the search was pruned
+    '''
+    if weight is None:
+        seen = {v}
+        frontier = [v]
+        c, S, d = 1, 0, 0
+        while frontier and c < reach:
+            # the nodes not found yet are at distance >= d + 1
+            if threshold is not None and _closeness_upper_bound(c, S, d + 1, reach, n) <= threshold:
+                return None
+            d += 1
+            nxt = []
+            for u in frontier:
+                for w in adj[u]:
+                    if w not in seen:
+                        seen.add(w)
+                        nxt.append(w)
+            c += len(nxt)
+            S += d*len(nxt)
+            frontier = nxt
+    else:
+        dist = {v: 0}
+        settled = set()
+        heap = [(0, v)]
+        c, S = 0, 0
+        while heap and c < reach:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            # the nodes not settled yet are at distance >= d
+            if threshold is not None and _closeness_upper_bound(c, S, d, reach, n) <= threshold:
+                return None
+            settled.add(u)
+            c += 1
+            S += d
+            for w, data in adj[u].items():
+                nd = d + data.get(weight, 1)
+                if w not in settled and nd < dist.get(w, float('inf')):
+                    dist[w] = nd
+                    heapq.heappush(heap, (nd, w))
+    return (c - 1)**2/((n - 1)*S) if S > 0 and n > 1 else 0.0
+
+@traced
+def top_k_closeness(G, k, weight = None):
+    '''
+    Top k nodes by closeness centrality (as nx.closeness_centrality with wf_improved = True, which
+    uses the incoming distances in a directed graph). Nodes are visited by decreasing degree and
+    the search of a node stops as soon as its closeness cannot enter the current top k.
+    The scores are exact.
+
+    input
+    G: the graph data
+    k: number of nodes to return
+    weight: name of the edge attribute used as distance, None for the number of hops
+
+    output
+    nodes: list of the top k nodes, in decreasing order of closeness
+    scores: list of their closeness centralities
+    errors: list of the error bounds of the scores (all 0)
+    '''
+    n = G.number_of_nodes()
+    adj = G.pred if G.is_directed() else G.adj
+    with stage('reach'):
+        reach = _reach_upper_bounds(G)
+    degree = G.in_degree() if G.is_directed() else G.degree()
+    order = sorted(G, key = lambda node: degree[node], reverse = True)
+
+    # min-heap of the current top k: (score, -position, node)
+    top = []
+    pruned = 0
+    with stage('searches', nodes = n):
+        for position, v in enumerate(order):
+            threshold = top[0][0] if len(top) == k else None
+            cc = _bounded_closeness(adj, v, n, reach[v], threshold, weight)
+            if cc is None or (threshold is not None and cc <= threshold):
+                pruned += cc is None
+                continue
+            heapq.heappush(top, (cc, -position, v))
+            if len(top) > k:
+                heapq.heappop(top)
+    count('pruned_searches', pruned)
+    top = sorted(top, reverse = True)
+    return [v for _, _, v in top], [cc for cc, _, _ in top], [0.0]*len(top)
+
+### TOP-K BETWEENNESS ###
+# Default maximum number of sources, as the k=1000 samples of the betweenness of funct_2
+SAMPLES = 1000
+
+def _dependencies(adj, s, weight):
+    '''
+    Brandes accumulation from a single source
+
+    output
+    delta: dictionary {node: dependency of s on the node}, for the nodes reached from s
+    '''
+    S = []
+    P = {s: []}
+    sigma = {s: 1}
+    if weight is None:
+        D = {s: 0}
+        queue = deque([s])
+        while queue:
+            v = queue.popleft()
+            S.append(v)
+            for w in adj[v]:
+                if w not in D:
+                    D[w] = D[v] + 1
+                    P[w] = []
+                    sigma[w] = 0
+                    queue.append(w)
+                if D[w] == D[v] + 1:
+                    sigma[w] += sigma[v]
+                    P[w].append(v)
+    else:
+        D = {}
+        seen = {s: 0}
+        tie = itertools.count()
+        heap = [(0, next(tie), s, s)]
+        while heap:
+            d, _, pred, v = heapq.heappop(heap)
+            if v in D:
+                continue
+            if v != s:
+                sigma[v] += sigma[pred]
+            S.append(v)
+            D[v] = d
+            for w, data in adj[v].items():
+                nd = d + data.get(weight, 1)
+                if w not in D and (w not in seen or nd < seen[w]):
+                    seen[w] = nd
+                    heapq.heappush(heap, (nd, next(tie), v, w))
+                    sigma[w] = 0
+                    P[w] = [v]
+                elif nd == seen.get(w):
+                    sigma[w] += sigma[v]
+                    P[w].append(v)
+    delta = dict.fromkeys(S, 0.0)
+    for w in reversed(S):
+        for v in P[w]:
+            delta[v] += sigma[v]/sigma[w]*(1 + delta[w])
+    delta[s] = 0.0
+    return delta
+
+@traced
+def top_k_betweenness(G, k, weight = None, epsilon = 0.1, delta = 0.1, batch = 100, max_samples = SAMPLES, seed = None):
+    '''
+    Top k nodes by betweenness centrality (normalized as nx.betweenness_centrality), estimated by
+    adaptive sampling: single-source dependencies are accumulated from random sources in rounds
+    of doubling size, and the sampling stops as soon as the ranking is decided by the error bounds
+    (the intervals of the k + 1 best nodes are disjoint and the k-th lower bound is above the upper
+    bound of every other node), every top k error bound is below epsilon times the k-th score,
+    max_samples sources are used, or every node has been a source (then the scores are exact).
+    Both rules are relative to the scores, which are tiny on large sparse graphs: an absolute bound
+    would stop while the errors are still wider than the scores.
+    The error bounds are empirical Bernstein bounds, which hold together with probability >= 1 - delta.
+    The range of the contributions of a node is bounded by the number of nodes it reaches, which is
+    much smaller than n for most nodes of a citation graph. On the citation graph a few sources still
+    route a large share of the shortest paths through the top nodes, so the bounds stay wider than the
+    scores for any t < n: max_samples then decides the cost, as the k=1000 samples of funct_2.
+
+    input
+    G: the graph data
+    k: number of nodes to return
+    weight: name of the edge attribute used as distance, None for the number of hops
+    epsilon: target error bound of the top k scores, relative to the k-th score
+    delta: probability that some error bound does not hold
+    batch: number of sources of the first round
+    max_samples: maximum number of sources (None means all the nodes, i.e. exact scores)
+    seed: seed of the random choice of the sources
+
+    output
+    nodes: list of the top k nodes, in decreasing order of estimated betweenness
+    scores: list of their estimated betweenness centralities
+    errors: list of the error bounds of the scores
+    '''
+    nodes = list(G)
+    n = len(nodes)
+    position = {node: i for i, node in enumerate(nodes)}
+    adj = G.succ if G.is_directed() else G.adj
+    max_samples = n if max_samples is None else min(max_samples, n)
+    if n <= 2:
+        return _ranking(dict.fromkeys(nodes, 0.0), dict.fromkeys(nodes, 0.0), k)
+
+    # contribution of one source to the normalized betweenness of a node, and its range: the
+    # dependency of a source on v is at most the number of nodes reached from v (v excluded)
+    scale = n/((n - 1)*(n - 2))
+    with stage('reach'):
+        reach = _reach_upper_bounds(G.reverse(copy = False) if G.is_directed() else G)
+    R = np.fromiter((min(reach[node] - 1, n - 2) for node in nodes), dtype = np.float64, count = n)*scale
+    rounds = max(1, math.ceil(math.log2(max(max_samples/batch, 1))) + 1)
+    log_term = math.log(2*n*rounds/delta)
+
+    sources = random.Random(seed).sample(nodes, max_samples)
+    total = np.zeros(n)
+    squares = np.zeros(n)
+    t = 0
+    target = batch
+    with stage('sampling'):
+        while True:
+            for s in sources[t:min(target, max_samples)]:
+                for v, dv in _dependencies(adj, s, weight).items():
+                    if dv:
+                        x = dv*scale
+                        total[position[v]] += x
+                        squares[position[v]] += x*x
+            t = min(target, max_samples)
+            target *= 2
+
+            mean = total/t
+            if t == n:
+                errors = np.zeros(n)
+            else:
+                variance = np.maximum(squares - t*mean*mean, 0)/max(t - 1, 1)
+                errors = np.sqrt(2*variance*log_term/t) + 7*R*log_term/(3*max(t - 1, 1))
+            if t >= max_samples:
+                break
+            top = np.argpartition(-mean, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(-mean[top], kind = 'stable')]
+            rest = np.setdiff1d(np.arange(n), top, assume_unique = True)
+            lower = mean[top] - errors[top]
+            upper = mean[top] + errors[top]
+            # every node of the top k is above the next one, and the k-th above all the others
+            ordered = (lower[:-1] > upper[1:]).all() and (len(rest) == 0 or lower[-1] > (mean[rest] + errors[rest]).max())
+            if ordered or errors[top].max() <= epsilon*mean[top[-1]]:
+                break
+    count('betweenness_sources', t)
+    return _ranking(dict(zip(nodes, mean.tolist())), dict(zip(nodes, errors.tolist())), k)
+
+### TOP-K PAGERANK ###
+@traced
+def top_k_pagerank(G, k, weight = None, alpha = 0.85, tol = 1e-10, max_iter = 200):
+    '''
+    Top k nodes by PageRank (as nx.pagerank): power iteration on numpy arrays, then a partial sort
+    that only orders the k best nodes
+
+    input
+    G: the graph data
+    k: number of nodes to return
+    weight: name of the edge attribute used as weight, None for unweighted edges
+    alpha: damping factor
+    tol, max_iter: stopping criterion of the power iteration, as in nx.pagerank (tol is smaller by default,
+                   so that the error bounds are below the typical scores)
+
+    output
+    nodes: list of the top k nodes, in decreasing order of PageRank
+    scores: list of their PageRank
+    errors: list of the error bounds of the scores, alpha/(1 - alpha) times the L1 change of the last iteration
+    '''
+    nodes = list(G)
+    n = len(nodes)
+    if n == 0:
+        return [],[],[]
+    position = {node: i for i, node in enumerate(nodes)}
+    adj = G.succ if G.is_directed() else G.adj
+    m = sum(len(nbrs) for nbrs in adj.values())
+    sources = np.fromiter((position[u] for u, nbrs in adj.items() for _ in nbrs), dtype = np.int64, count = m)
+    targets = np.fromiter((position[v] for nbrs in adj.values() for v in nbrs), dtype = np.int64, count = m)
+    weights = np.fromiter((d.get(weight, 1) if weight is not None else 1 for nbrs in adj.values() for d in nbrs.values()),
+                          dtype = np.float64, count = m)
+    out_weight = np.bincount(sources, weights = weights, minlength = n)
+    dangling = out_weight == 0
+    edge_share = weights/np.where(dangling, 1, out_weight)[sources]
+
+    x = np.full(n, 1.0/n)
+    with stage('power_iteration'):
+        for iteration in range(max_iter):
+            previous = x
+            x = alpha*(np.bincount(targets, weights = previous[sources]*edge_share, minlength = n) + previous[dangling].sum()/n) + (1 - alpha)/n
+            change = np.abs(x - previous).sum()
+            if change < n*tol:
+                break
+        else:
+            raise nx.PowerIterationFailedConvergence(max_iter)
+    count('pagerank_iterations', iteration + 1)
+
+    with stage('partial_sort', k = k):
+        top = np.argpartition(-x, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.lexsort((top, -x[top]))]
+    error = alpha/(1 - alpha)*change
+    return [nodes[i] for i in top], x[top].tolist(), [error]*len(top)
+
+### TOP-K QUERY ###
+@traced
+def top_k_central(G, k, measure, G_name):
+    '''
+    input
+    G: the graph data
+    k: number of nodes to return
+    measure: string that can be 'closeness', 'betweenness' or 'pagerank'
+    G_name: string that can be 'citation' or 'collaboration' (the collaboration graph uses its weights, as in funct_2)
+
+    output
+    nodes: list of the ids of the top k nodes by the centrality measure, in decreasing order
+    scores: list of their centralities
+    errors: list of the error bounds of the centralities
+    '''
+    weight = 'weight' if G_name.lower() == 'collaboration' else None
+    k = min(k, G.number_of_nodes())
+    if k <= 0:
+        return [],[],[]
+    if measure == 'closeness':
+        return top_k_closeness(G, k, weight)
+    if measure == 'betweenness':
+        return top_k_betweenness(G, k, weight)
+    if measure == 'pagerank':
+        return top_k_pagerank(G, k, weight)
+    raise ValueError(f"Unknown centrality measure {measure}")
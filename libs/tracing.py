@@ -0,0 +1,187 @@
+import functools
+import json
+import logging
+import time
+
+# Current sink: None means that the instrumentation is disabled
+_sink = None
+# Stack of the stages that are currently open
+_stack = []
+
+### SINKS ###
+class MemorySink:
+    '''
+    Keeps the events in memory, in the list self.events
+    '''
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def clear(self):
+        self.events = []
+
+class LogSink:
+    '''
+    Writes every event as a JSON string through the logging module
+
+    input
+    logger: logger to use, defaults to the 'libs.tracing' logger
+    level: logging level of the records
+    '''
+    def __init__(self, logger = None, level = logging.INFO):
+        self.logger = logger if logger is not None else logging.getLogger(__name__)
+        self.level = level
+
+    def __call__(self, event):
+        self.logger.log(self.level, json.dumps(event, default = str))
+
+class JsonFileSink:
+    '''
+    Appends every event to a file, one JSON object per line
+
+    input
+    path: path of the output file
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a')
+
+    def __call__(self, event):
+        self.file.write(json.dumps(event, default = str) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+### ENABLE / DISABLE ###
+def enable(sink):
+    '''
+    Turns the instrumentation on. Any callable accepting one dictionary can be used as sink.
+    '''
+    global _sink
+    _sink = sink
+    _stack.clear()
+
+def disable():
+    '''
+    Turns the instrumentation off
+    '''
+    global _sink
+    _sink = None
+    _stack.clear()
+
+def is_enabled():
+    return _sink is not None
+
+class tracing:
+    '''
+    Context manager that enables the instrumentation with the given sink and
+    restores the previous state at exit
+
+    Example:
+    sink = MemorySink()
+    with tracing(sink):
+        visual_5(G, paper_1, paper_2, N)
+    '''
+    def __init__(self, sink):
+        self.sink = sink
+
+    def __enter__(self):
+        global _sink
+        self.previous = _sink
+        _sink = self.sink
+        return self.sink
+
+    def __exit__(self, *exc):
+        global _sink
+        _sink = self.previous
+        return False
+
+### STAGES AND COUNTERS ###
+class _NullStage:
+    '''
+    Stage returned when the instrumentation is disabled, it does nothing
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.counters = {}
+
+    def __enter__(self):
+        self.parent = _stack[-1].name if _stack else None
+        self.depth = len(_stack)
+        _stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if _stack and _stack[-1] is self:
+            _stack.pop()
+        if _sink is not None:
+            event = {
+                'event': 'stage',
+                'stage': self.name,
+                'parent': self.parent,
+                'depth': self.depth,
+                'elapsed': elapsed,
+                'counters': self.counters,
+            }
+            if self.fields:
+                event['fields'] = self.fields
+            if exc_type is not None:
+                event['error'] = exc_type.__name__
+            _sink(event)
+        return False
+
+def stage(name, **fields):
+    '''
+    Times a block of code, to be used as context manager:
+
+    with stage('betweenness', n = len(G)):
+        ...
+
+    When the block ends an event {'event': 'stage', 'stage': name, 'elapsed': seconds, ...}
+    is sent to the sink, together with the counters incremented inside the block.
+    When the instrumentation is disabled a shared no-op object is returned.
+    '''
+    if _sink is None:
+        return _NULL_STAGE
+    return _Stage(name, fields)
+
+def count(name, n = 1):
+    '''
+    Increments the counter name of the innermost open stage by n.
+    Outside of any stage, a 'counter' event is sent directly to the sink.
+    In hot loops it is cheaper to accumulate a local integer and call count once at the end.
+    '''
+    if _sink is None:
+        return
+    if _stack:
+        counters = _stack[-1].counters
+        counters[name] = counters.get(name, 0) + n
+    else:
+        _sink({'event': 'counter', 'counter': name, 'value': n})
+
+def traced(func):
+    '''
+    Decorator that runs every call of func inside a stage named after the function
+    '''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _sink is None:
+            return func(*args, **kwargs)
+        with _Stage(func.__name__, {}):
+            return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,88 @@
+import heapq
+import itertools
+from .tracing import traced, count
+
+### HELPERS ###
+def _successors(G):
+    return G.succ if G.is_directed() else G.adj
+
+def _predecessors(G):
+    return G.pred if G.is_directed() else G.adj
+
+def path_papers(G, path):
+    '''
+    input
+    G: the graph data
+    path: list of nodes
+
+    output
+    papers: list of the 'paper' labels of the edges along the path
+    '''
+    return [G[u][v].get('paper') for u, v in zip(path[:-1], path[1:])]
+
+### BIDIRECTIONAL DIJKSTRA ###
+@traced
+def bidirectional_dijkstra(G, source, target, weight = 'weight'):
+    '''
+    Weighted point-to-point shortest path: two Dijkstra searches over binary heaps,
+    one from source on the outgoing edges and one from target on the incoming edges,
+    stopped as soon as the two frontiers cannot improve the best path found.
+
+    input
+    G: the graph data
+    source, target: input nodes
+    weight: name of the edge attribute used as length (missing values count as 1)
+
+    output
+    path: list of nodes from source to target ([] if there is no path)
+    papers: list of papers which link the nodes along the path
+    length: total weight of the path (inf if there is no path)
+    '''
+    if source not in G or target not in G:
+        print("Nodes not in the graph")
+        return [],[],float('inf')
+    if source == target:
+        return [source],[],0
+
+    adj = (_successors(G), _predecessors(G))
+    dist = ({source: 0}, {target: 0})
+    parent = ({source: None}, {target: None})
+    settled = (set(), set())
+    # the counter breaks ties between equal distances without comparing nodes
+    tie = itertools.count()
+    heaps = ([(0, next(tie), source)], [(0, next(tie), target)])
+    best, meeting = float('inf'), None
+    expansions = 0
+
+    while heaps[0] and heaps[1]:
+        # stop when no path through an unsettled node can be shorter than the best one
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        # advance the search with the smaller frontier
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        d, _, v = heapq.heappop(heaps[side])
+        if v in settled[side]:
+            continue
+        settled[side].add(v)
+        expansions += 1
+        for u, data in adj[side][v].items():
+            nd = d + data.get(weight, 1)
+            if nd < dist[side].get(u, float('inf')):
+                dist[side][u] = nd
+                parent[side][u] = v
+                heapq.heappush(heaps[side], (nd, next(tie), u))
+            # a path source -> ... -> v -> u -> ... -> target
+            if u in dist[1-side] and nd + dist[1-side][u] < best:
+                best, meeting = nd + dist[1-side][u], u
+    count('dijkstra_expansions', expansions)
+
+    if meeting is None:
+        print(f"There is no such path between node {source} and {target}.")
+        return [],[],float('inf')
+    path = [meeting]
+    while parent[0][path[-1]] is not None:
+        path.append(parent[0][path[-1]])
+    path = path[::-1]
+    while parent[1][path[-1]] is not None:
+        path.append(parent[1][path[-1]])
+    return path, path_papers(G, path), best
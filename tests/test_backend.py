@@ -0,0 +1,65 @@
+import json
+
+import networkx as nx
+import pytest
+
+from libs import backend, tracing
+from libs.benchmark import collaboration_graph
+
+def baseline_communities(G, connected_components):
+    # the loop of funct_5 before the components were scheduled separately. G.subgraph would iterate
+    # over the (hash dependent) order of the component set and break the betweenness ties differently
+    communities = []
+    num_links = 0
+    for component in connected_components:
+        if len(list(component)) > 1:
+            c, k = backend.girvan_newman(nx.subgraph_view(G, filter_node = lambda node: node in component).copy())
+            num_links += k
+            communities.extend(list(i) for i in c)
+    return communities, num_links
+
+def components_graph(directed):
+    G = nx.DiGraph() if directed else nx.Graph()
+    # a pair with a self-loop
+    G.add_edges_from([('a', 'b'), ('a', 'a')])
+    # a pair linked in both directions (a single edge when undirected)
+    G.add_edges_from([('c', 'd'), ('d', 'c')])
+    # a singleton with a self-loop
+    G.add_edge('e', 'e')
+    # larger components, one with a self-loop
+    H = collaboration_graph(300, 1)
+    G.add_edges_from(H.edges())
+    G.add_edge('0', '0')
+    # two triangles joined by a bridge, the only edge of highest betweenness
+    G.add_edges_from([('x0', 'x1'), ('x1', 'x2'), ('x2', 'x0'), ('x2', 'x3'), ('x3', 'x4'), ('x4', 'x5'), ('x5', 'x3')])
+    return G
+
+@pytest.mark.parametrize('workers', [1, 2])
+@pytest.mark.parametrize('directed', [False, True])
+def test_communities_by_component_matches_baseline(directed, workers):
+    G = components_graph(directed)
+    if directed:
+        connected_components = list(nx.weakly_connected_components(G))
+    else:
+        connected_components = list(nx.connected_components(G))
+    communities, num_links = backend.communities_by_component(G, connected_components, workers)
+    expected, expected_links = baseline_communities(G, connected_components)
+    assert num_links == expected_links
+    assert sorted(map(sorted, communities)) == sorted(map(sorted, expected))
+
+def test_pool_iterations_are_counted_once(tmp_path):
+    # three barbells: one bridge to remove in each
+    G = nx.Graph()
+    for b in range(3):
+        G.add_edges_from(nx.relabel_nodes(nx.barbell_graph(5, 0), lambda v: f'{b} {v}').edges())
+    connected_components = list(nx.connected_components(G))
+    # a file sink, which forked workers could also write to
+    path = tmp_path / 'events.jsonl'
+    sink = tracing.JsonFileSink(str(path))
+    with tracing.tracing(sink):
+        communities, num_links = backend.communities_by_component(G, connected_components, 2)
+    sink.close()
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    iterations = [e['counters'].get('girvan_newman_iterations', 0) for e in events if e['event'] == 'stage']
+    assert num_links == 3
+    assert sum(iterations) == 3
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import os
+import random
+
+import networkx as nx
+import pytest
+
+from libs import backend
+from libs.benchmark import collaboration_graph, connected_pair, top_nodes
+from libs.edgestore import EdgeStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CITATION_GRAPH = os.path.join(ROOT, 'citation_graph.graphml')
+
+def funct_5(G, paper_1, paper_2, N):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return backend.funct_5(G, paper_1, paper_2, N, 1)
+
+def citation_graph():
+    if not os.path.exists(CITATION_GRAPH):
+        pytest.skip('citation_graph.graphml is not available')
+    return nx.read_graphml(CITATION_GRAPH)
+
+@pytest.mark.parametrize('N', [50, 150])
+@pytest.mark.parametrize('source', ['collaboration', 'citation', 'graphml'])
+def test_top_subgraph_matches_funct_5_in_memory(tmp_path, source, N):
+    if source == 'collaboration':
+        G = collaboration_graph(4000, 3)
+        store = EdgeStore.from_graph(G, str(tmp_path))
+    elif source == 'citation':
+        G = citation_graph()
+        store = EdgeStore.from_graph(G, str(tmp_path))
+    else:
+        G = citation_graph()
+        store = EdgeStore.from_graphml(CITATION_GRAPH, str(tmp_path))
+    H = store.top_subgraph(N)
+    assert list(H.nodes) == list(backend.top_n_subgraph(G, N).nodes)
+    assert list(H.edges) == list(backend.top_n_subgraph(G, N).edges)
+
+    paper_1, paper_2 = connected_pair(G, top_nodes(G, N))
+    assert funct_5(H, paper_1, paper_2, N) == funct_5(G, paper_1, paper_2, N)
+
+def shortest_path(G, starting_node, finish_node):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return backend.shortest_path(G, starting_node, finish_node)
+
+@pytest.mark.parametrize('source', ['graph', 'graphml'])
+def test_shortest_path_matches_backend(tmp_path, source):
+    G = collaboration_graph(20000, 2)
+    if source == 'graph':
+        store = EdgeStore.from_graph(G, str(tmp_path))
+    else:
+        path = str(tmp_path / 'collaboration.graphml')
+        nx.write_graphml(G, path)
+        store = EdgeStore.from_graphml(path, str(tmp_path / 'store'))
+        # the adjacency order of the file is the order of its edges
+        G = nx.read_graphml(path)
+    rng = random.Random(0)
+    nodes = list(G.nodes)
+    for _ in range(200):
+        a, b = rng.choice(nodes), rng.choice(nodes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = store.shortest_path(a, b)
+        assert result == shortest_path(G, a, b)
+
+@pytest.mark.parametrize('G_name', ['collaboration', 'citation'])
+def test_degree_statistics_matches_funct_1(tmp_path, G_name):
+    if G_name == 'collaboration':
+        G = collaboration_graph(4000, 3)
+    else:
+        G = citation_graph()
+    store = EdgeStore.from_graph(G, str(tmp_path))
+    stats = store.degree_statistics(G_name)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = backend.funct_1(G, G_name)
+    if G_name == 'citation':
+        nodes, edges, density, degrees, degrees_in, degrees_out, average_deg, percentile_95, hubs, is_sparse = result
+        assert stats['degrees_in'].tolist() == list(degrees_in.values())
+        assert stats['degrees_out'].tolist() == list(degrees_out.values())
+    else:
+        nodes, edges, density, degrees, average_deg, percentile_95, hubs, is_sparse = result
+    assert (stats['n'], stats['m']) == (len(nodes), len(edges))
+    assert stats['density'] == pytest.approx(density)
+    assert stats['average_deg'] == pytest.approx(average_deg)
+    assert stats['degrees'].tolist() == list(degrees.values())
+    assert stats['percentile_95'] == percentile_95
+    assert stats['hubs'] == hubs
+    assert stats['is_sparse'] == is_sparse
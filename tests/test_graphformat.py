@@ -0,0 +1,22 @@
+import networkx as nx
+
+from libs import backend
+from libs.graphformat import intern_attributes
+from libs.benchmark import collaboration_graph
+
+def test_interning_keeps_the_values_and_counts_them():
+    G = nx.parse_graphml('\n'.join(nx.generate_graphml(collaboration_graph(2000))))
+    expected_nodes = {n: dict(d) for n, d in G.nodes(data = True)}
+    expected_edges = {(u, v): dict(d) for u, v, d in G.edges(data = True)}
+    name = G.nodes['5']['author_name']
+
+    distinct, values = intern_attributes(G)
+    assert values == G.number_of_nodes() + G.number_of_edges()
+    assert distinct == len({d['author_name'] for _, d in G.nodes(data = True)} | {d['paper'] for _, _, d in G.edges(data = True)})
+    assert distinct < values
+
+    assert {n: d for n, d in G.nodes(data = True)} == expected_nodes
+    assert {(u, v): d for u, v, d in G.edges(data = True)} == expected_edges
+    assert backend.id_finder(G, name) == ['5']
+    shared = {}
+    assert all(shared.setdefault(d['paper'], d['paper']) is d['paper'] for _, _, d in G.edges(data = True))
@@ -0,0 +1,73 @@
+import networkx as nx
+import numpy as np
+
+from libs import backend
+from libs.memo import Memo
+
+def path_graph(n = 6):
+    G = nx.Graph()
+    for i in range(n - 1):
+        G.add_edge(str(i), str(i + 1), paper = f'Paper {i}', weight = 1.0)
+    return G
+
+def test_mutations_that_keep_the_counts_are_misses():
+    G = path_graph()
+    memo = Memo()
+    funct_3 = memo.wrap(backend.funct_3)
+    assert funct_3(G, [], '0', '5', 10)[0] == ['0', '1', '2', '3', '4', '5']
+    assert funct_3(G, [], '0', '5', 10)[0] == ['0', '1', '2', '3', '4', '5']
+    assert memo.stats()['hits'] == 1
+
+    # swap an edge: same numbers of nodes and edges, seen through the version counter
+    G.remove_edge('2', '3')
+    G.add_edge('0', '5', paper = 'Paper 5', weight = 10.0)
+    assert funct_3(G, [], '0', '5', 10) == backend.funct_3(G, [], '0', '5', 10)
+    assert funct_3(G, [], '0', '5', 10)[0] == ['0', '5']
+    assert memo.stats()['misses'] == 2
+
+    # edit a weight in place: invalidate is needed
+    G.add_edge('2', '3', paper = 'Paper 2', weight = 1.0)
+    assert funct_3(G, [], '0', '5', 10, 'weight')[0] == ['0', '1', '2', '3', '4', '5']
+    assert memo.stats()['misses'] == 3
+    G['0']['5']['weight'] = 1.0
+    memo.invalidate(G)
+    assert funct_3(G, [], '0', '5', 10, 'weight')[0] == ['0', '5']
+    assert memo.stats()['misses'] == 4
+
+def test_verify_sees_attributes_changed_in_place():
+    G = path_graph()
+    memo = Memo(verify = True)
+    funct_3 = memo.wrap(backend.funct_3)
+    assert funct_3(G, [], '0', '5', 10, 'weight')[0] == ['0', '1', '2', '3', '4', '5']
+    G['0']['1']['paper'] = 'Edited'
+    assert funct_3(G, [], '0', '5', 10, 'weight')[1][0] == 'Edited'
+    G['2']['3']['weight'] = 10.0
+    G.add_edge('0', '5', paper = 'Paper 5', weight = 10.0)
+    assert funct_3(G, [], '0', '5', 10, 'weight')[0] == ['0', '5']
+    assert memo.stats()['misses'] == 3
+
+def test_keyword_and_default_arguments_share_one_entry():
+    G = path_graph()
+    memo = Memo()
+    funct_3 = memo.wrap(backend.funct_3)
+    funct_3(G, [], '0', '5', 10)
+    funct_3(G, [], '0', '5', 10, None)
+    funct_3(G, [], '0', '5', N = 10, weight = None)
+    assert memo.stats()['misses'] == 1
+    assert funct_3(G, [], '0', '5', 10, weight = 'weight')[0] == ['0', '1', '2', '3', '4', '5']
+    assert memo.stats()['misses'] == 2
+
+def test_numpy_and_unreferenceable_arguments():
+    G = path_graph()
+    memo = Memo()
+    funct_3 = memo.wrap(backend.funct_3)
+    funct_3(G, [], '0', '5', np.int64(10))
+    assert funct_3(G, [], '0', '5', 10)[0] == ['0', '1', '2', '3', '4', '5']
+    assert memo.stats()['hits'] == 1
+
+    # an object without weak references is not cached
+    def lookup(G, table):
+        return table[0]
+    lookup = memo.wrap(lookup)
+    assert lookup(G, (object(),)) is not None
+    assert memo.stats()['size'] == 1
@@ -0,0 +1,70 @@
+import asyncio
+import contextlib
+import io
+import socket
+import threading
+
+import networkx as nx
+import pytest
+
+from libs import backend, service
+from libs.benchmark import citation_graph, collaboration_graph
+from libs.topk import top_k_central
+
+@pytest.fixture(scope = 'module')
+def running(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('graphs')
+    paths = {'citation': str(directory / 'citation.graphml'), 'collaboration': str(directory / 'collaboration.graphml')}
+    nx.write_graphml(citation_graph(3000), paths['citation'])
+    nx.write_graphml(collaboration_graph(3000), paths['collaboration'])
+    app = service.QueryService(paths, workers = 2)
+    app.start_pool()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target = loop.run_forever, daemon = True)
+    thread.start()
+    server = asyncio.run_coroutine_threadsafe(app.start('127.0.0.1', 0), loop).result()
+    port = server.sockets[0].getsockname()[1]
+    yield service.ServiceClient(f'http://127.0.0.1:{port}', timeout = 60), paths
+    loop.call_soon_threadsafe(app.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    service._GRAPHS.clear()
+
+def local(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return service._jsonable(func(*args))
+
+def test_queries_match_the_backend(running):
+    client, paths = running
+    citation, collaboration = nx.read_graphml(paths['citation']), nx.read_graphml(paths['collaboration'])
+    assert client.graphs() == {'citation': {'directed': True, 'nodes': citation.number_of_nodes(), 'edges': citation.number_of_edges()},
+                               'collaboration': {'directed': False, 'nodes': collaboration.number_of_nodes(), 'edges': collaboration.number_of_edges()}}
+    name = collaboration.nodes['5']['author_name']
+    assert client.call('collaboration', 'id_finder', name) == ['5']
+
+    top = [node for node, _ in sorted(collaboration.degree, key = lambda x: x[1], reverse = True)[:4]]
+    assert client.call('collaboration', 'funct_3', top[1:3], top[0], top[3], 100) == local(backend.funct_3, collaboration, top[1:3], top[0], top[3], 100)
+    assert client.call('collaboration', 'funct_4', top[0], top[1], 100) == local(backend.funct_4, collaboration, top[0], top[1], 100)
+    assert client.call('citation', 'top_k_central', 10, 'closeness', 'citation') == local(top_k_central, citation, 10, 'closeness', 'citation')
+
+    H = client.graph('collaboration').neighbourhood(100, [top[0]], 1, 50)
+    expected = backend.k_hop_subgraph(backend.top_n_subgraph(collaboration, 100), [top[0]], 1, 50)
+    assert set(H) == set(expected) and H.number_of_edges() == expected.number_of_edges()
+
+def test_timeout_and_unknown_names(running):
+    client, _ = running
+    with pytest.raises(RuntimeError, match = 'timed out'):
+        client.call('citation', 'funct_2', '1', 'citation', timeout = 0)
+    with pytest.raises(RuntimeError, match = 'Unknown graph'):
+        client.call('missing', 'funct_1', 'missing')
+    with pytest.raises(RuntimeError, match = 'Unknown query'):
+        client.call('citation', 'missing')
+
+def test_client_stops_waiting_for_a_silent_server():
+    # a server that accepts the connection and never answers
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen()
+        client = service.ServiceClient(f'http://127.0.0.1:{listener.getsockname()[1]}', socket_timeout = 0.5)
+        with pytest.raises(TimeoutError):
+            client.graphs()
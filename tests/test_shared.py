@@ -0,0 +1,60 @@
+import concurrent.futures
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from libs.benchmark import citation_graph, collaboration_graph
+from libs.shared import SharedGraph, attached, to_scipy_sparse
+
+scipy = pytest.importorskip('scipy')
+
+def worker_view(spec):
+    # what a worker reads from the attached graph, as plain Python values
+    shared = attached(spec)
+    A = shared.to_scipy()
+    return ({shared.node_id(i): sorted(shared.node_id(j) for j in shared.neighbors(i)) for i in range(shared.number_of_nodes())},
+            shared.degree.tolist(), float(A.sum()), int(A.nnz))
+
+def graph(directed):
+    if directed:
+        G = citation_graph(3000)
+        for u, v in G.edges():
+            G.edges[u, v]['weight'] = (int(u) * 7 + int(v)) % 5 + 1
+        return G
+    G = collaboration_graph(3000)
+    G.add_edge('0', '0', weight = 0.5, paper = 'Paper 0')
+    return G
+
+@pytest.mark.parametrize('directory', [False, True])
+@pytest.mark.parametrize('directed', [False, True])
+def test_publish_attach_in_a_pool_and_scipy_export(tmp_path, directed, directory):
+    G = graph(directed)
+    expected = nx.to_scipy_sparse_array(G, nodelist = list(G), weight = 'weight', format = 'csr')
+    with SharedGraph.publish(G, directory = str(tmp_path) if directory else None) as shared:
+        with concurrent.futures.ProcessPoolExecutor(max_workers = 2) as pool:
+            views = list(pool.map(worker_view, [shared.spec]*4))
+        adjacency = {str(u): sorted(G[u]) for u in G}
+        degree = [d for _, d in G.degree()]
+        for view in views:
+            assert view == (adjacency, degree, float(expected.sum()), expected.nnz)
+
+        A = shared.to_scipy()
+        assert A.has_sorted_indices and A.has_canonical_format
+        assert np.shares_memory(A.indices, shared.indices)
+        assert (A != expected).nnz == 0
+        assert all((np.diff(shared.neighbors(i)) > 0).all() for i in range(shared.number_of_nodes()))
+        # already canonical: nothing is written to the read-only arrays
+        A.sort_indices()
+        A.sum_duplicates()
+        B = A.copy()
+        B.eliminate_zeros()
+        assert (B != expected).nnz == 0
+        assert (shared.to_scipy(weighted = False) != (expected != 0)).nnz == 0
+        H = shared.to_networkx()
+        assert H.number_of_edges() == G.number_of_edges()
+        assert all(H.edges[u, v]['weight'] == d['weight'] for u, v, d in G.edges(data = True))
+        # the views must be dropped before the block is closed
+        del A, B
+
+    assert (to_scipy_sparse(G) != expected).nnz == 0
@@ -0,0 +1,76 @@
+import random
+
+import networkx as nx
+import pytest
+
+from libs import topk, tracing
+from libs.benchmark import citation_graph
+
+def small_scores_graph(n = 400, m = 2, seed = 7):
+    # every paper cites m older papers: as on the citation graph, the betweenness of every node is below 0.01
+    rng = random.Random(seed)
+    G = nx.DiGraph()
+    G.add_nodes_from(str(v) for v in range(n))
+    for v in range(1, n):
+        G.add_edges_from((str(v), str(u)) for u in rng.sample(range(v), min(m, v)))
+    return G
+
+def exact_ranking(G, k):
+    scores = nx.betweenness_centrality(G)
+    return sorted(scores, key = lambda v: -scores[v])[:k], scores
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_top_k_betweenness_ranking_on_small_scores(seed):
+    G = small_scores_graph()
+    k = 5
+    expected, scores = exact_ranking(G, k + 1)
+    assert scores[expected[0]] < 0.01
+    # the ranking is well defined: no ties among the k + 1 best nodes
+    assert len({round(scores[v], 12) for v in expected}) == k + 1
+
+    # epsilon is relative to the k-th score: even a loose target keeps the error bounds below the scores
+    epsilon = 0.5
+    nodes, estimates, errors = topk.top_k_betweenness(G, k, epsilon = epsilon, batch = 20, seed = seed)
+    assert nodes == expected[:k]
+    for v, estimate, error in zip(nodes, estimates, errors):
+        assert abs(estimate - scores[v]) <= error + 1e-12
+    assert max(errors) <= epsilon*estimates[-1]
+
+def sources_used(run):
+    sink = tracing.MemorySink()
+    with tracing.tracing(sink):
+        result = run()
+    return result, sum(e['counters'].get('betweenness_sources', 0) for e in sink.events if e['event'] == 'stage')
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_top_k_betweenness_stops_early_on_a_clear_gap(seed):
+    # the centre and one large hub are far above the 50 small hubs
+    G = nx.Graph()
+    for i, leaves in enumerate([300] + [20]*50):
+        G.add_edge('centre', f'hub {i}')
+        G.add_edges_from((f'hub {i}', f'leaf {i} {j}') for j in range(leaves))
+    expected, scores = exact_ranking(G, 2)
+    (nodes, estimates, errors), t = sources_used(lambda: topk.top_k_betweenness(G, 2, seed = seed))
+    assert nodes == expected
+    assert t < topk.SAMPLES < G.number_of_nodes()
+    for v, estimate, error in zip(nodes, estimates, errors):
+        assert error < estimate
+        assert abs(estimate - scores[v]) <= error
+
+def test_reach_upper_bounds_are_exact_within_the_memory_budget():
+    G = citation_graph(5000).reverse(copy = False)
+    exact = topk._reach_upper_bounds(G)
+    assert all(exact[v] == len(nx.ancestors(G, v)) + 1 for v in list(G)[::50])
+    # without room for the bitsets the sizes are summed: still upper bounds
+    summed = topk._reach_upper_bounds(G, max_bytes = 0)
+    assert all(summed[v] >= exact[v] for v in G) and summed != exact
+
+def test_top_k_betweenness_stops_when_the_ranking_is_decided():
+    # the centre of a star of stars is on almost every shortest path
+    G = nx.Graph()
+    for i in range(40):
+        G.add_edge('centre', f'hub {i}')
+        G.add_edges_from((f'hub {i}', f'leaf {i} {j}') for j in range(25))
+    (nodes, estimates, errors), t = sources_used(lambda: topk.top_k_betweenness(G, 1, seed = 0))
+    assert nodes == ['centre']
+    assert t < topk.SAMPLES < G.number_of_nodes()
@@ -0,0 +1,37 @@
+import contextlib
+import io
+import random
+
+import networkx as nx
+import pytest
+
+from libs.weighted_paths import bidirectional_dijkstra
+
+def random_weighted_graph(seed, directed):
+    rng = random.Random(seed)
+    G = nx.gnm_random_graph(60, 150, seed = seed, directed = directed)
+    G = nx.relabel_nodes(G, str)
+    for u, v, d in G.edges(data = True):
+        d['weight'] = rng.choice([0.2, 0.25, 0.333, 0.5, 1.0, 2.5])
+        d['paper'] = f'Paper {u} {v}'
+    return G
+
+@pytest.mark.parametrize('directed', [False, True])
+@pytest.mark.parametrize('seed', range(15))
+def test_bidirectional_dijkstra_matches_networkx(seed, directed):
+    G = random_weighted_graph(seed, directed)
+    rng = random.Random(seed)
+    nodes = list(G)
+    for _ in range(20):
+        a, b = rng.choice(nodes), rng.choice(nodes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            path, papers, length = bidirectional_dijkstra(G, a, b)
+        try:
+            expected = nx.dijkstra_path_length(G, a, b)
+        except nx.NetworkXNoPath:
+            assert (path, papers, length) == ([], [], float('inf'))
+            continue
+        assert length == pytest.approx(expected)
+        assert path[0] == a and path[-1] == b
+        assert sum(G[u][v]['weight'] for u, v in zip(path[:-1], path[1:])) == pytest.approx(expected)
+        assert papers == [G[u][v]['paper'] for u, v in zip(path[:-1], path[1:])]